@@ -0,0 +1,181 @@
+import argparse
+import csv
+import functools
+import json
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn.functional as F
+from estee.generators.irw import mapreduce
+from torch_geometric.loader import DataLoader
+
+from makespan_prediction import df_to_geometric_data
+from src.conversion import estee_to_pyg
+from src.data import TrainExample
+from src.dataset import load_dataset, save_dataset
+from src.families import FAMILIES, generate_graph
+from src.generator import merge_neighbours, simulate_graph, triplets
+from src.model import GCN
+
+# Each generator takes an approximate task count
+GENERATORS: Dict[str, Callable] = {
+    # mapreduce(count) has 2 * count + 1 tasks and count ** 2 edges (every map task sends an
+    # output to every reduce task)
+    "mapreduce": lambda tasks: mapreduce(max((tasks - 1) // 2, 1)),
+    "merge_neighbours": lambda tasks: merge_neighbours(max(tasks // 2, 2)),
+    "triplets": lambda tasks: triplets(max(tasks // 3, 1), cpus=1),
+    # Families of the generator registry, built in bulk
+    **{f"{name}-bulk": functools.partial(generate_graph, name) for name in FAMILIES},
+}
+
+STAGES = ("generate", "simulate", "convert", "df_convert", "save", "load", "train_epoch")
+
+DEFAULT_SIZES = (5, 50, 500, 5000, 10000)
+
+# Largest default size of generators whose edge count grows quadratically with the task count,
+# larger sizes are only benchmarked when passed explicitly with --sizes
+DEFAULT_MAX_SIZES = {
+    "mapreduce": 1000,
+}
+
+# Number of graphs used by the dataset-level stages
+DATASET_SIZE = 16
+
+
+def measure(fn: Callable, repeat: int) -> List[float]:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def train_epoch(dataset, num_features: int):
+    model = GCN(num_features)
+    optimizer = torch.optim.Adam(model.parameters(), lr=0.001)
+    for batch in DataLoader(dataset, batch_size=64, shuffle=True):
+        optimizer.zero_grad()
+        loss = F.mse_loss(model(batch), batch.y.unsqueeze(1))
+        loss.backward()
+        optimizer.step()
+
+
+def benchmark_family(family: str, size: int, stages, repeat: int, workdir: str) -> List[dict]:
+    generate = GENERATORS[family]
+    example = TrainExample(generate(size), worker_count=2)
+    examples = [TrainExample(generate(size), worker_count=random.randint(1, 2))
+                for _ in range(DATASET_SIZE)]
+    df = pd.DataFrame({
+        "example": examples,
+        "makespan": [simulate_graph(e) for e in examples]
+    })
+    dataset_path = f"{workdir}/{family}-{size}"
+
+    fns = {
+        "generate": lambda: generate(size),
+        "simulate": lambda: simulate_graph(example),
+        "convert": lambda: estee_to_pyg(example),
+        "df_convert": lambda: df_to_geometric_data(df),
+        "save": lambda: save_dataset(dataset_path, df),
+        "load": lambda: load_dataset(dataset_path),
+    }
+    if "train_epoch" in stages:
+        data = df_to_geometric_data(df)
+        fns["train_epoch"] = lambda: train_epoch(data, data[0].num_features)
+    if "load" in stages:
+        save_dataset(dataset_path, df)
+
+    results = []
+    for stage in stages:
+        durations = measure(fns[stage], repeat)
+        graphs = DATASET_SIZE if stage in ("df_convert", "save", "load", "train_epoch") else 1
+        median = statistics.median(durations)
+        results.append({
+            "stage": stage,
+            "family": family,
+            "size": size,
+            "task_count": example.graph.task_count,
+            "repeat": repeat,
+            "median_s": median,
+            "min_s": min(durations),
+            "graphs_per_s": graphs / median if median > 0 else None,
+        })
+        print(f"{stage:>12} {family:>16} {size:>6}: {median * 1000:.3f} ms", file=sys.stderr)
+    return results
+
+
+def compare(results: List[dict], baseline: List[dict], threshold: float) -> List[dict]:
+    """
+    Returns results whose median time is more than `threshold` times slower than the baseline.
+    """
+    key = lambda r: (r["stage"], r["family"], r["size"])
+    baseline = {key(r): r for r in baseline}
+    regressions = []
+    for result in results:
+        base = baseline.get(key(result))
+        if base is not None and result["median_s"] > base["median_s"] * threshold:
+            regressions.append(dict(result, baseline_s=base["median_s"],
+                                    ratio=result["median_s"] / base["median_s"]))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the generate -> simulate -> convert -> train pipeline")
+    parser.add_argument("--sizes", type=int, nargs="+", default=None,
+                        help=f"Approximate task counts (default: {DEFAULT_SIZES})")
+    parser.add_argument("--families", nargs="+", default=list(GENERATORS),
+                        choices=list(GENERATORS))
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark.json", help="JSON results file")
+    parser.add_argument("--csv", help="Also write the results as CSV")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="Slowdown ratio against the baseline treated as a regression")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+    torch.manual_seed(args.seed)
+
+    workdir = tempfile.mkdtemp()
+    try:
+        results = []
+        for family in args.families:
+            sizes = args.sizes
+            if sizes is None:
+                max_size = DEFAULT_MAX_SIZES.get(family)
+                sizes = [size for size in DEFAULT_SIZES if max_size is None or size <= max_size]
+            for size in sizes:
+                results.extend(benchmark_family(family, size, args.stages, args.repeat, workdir))
+    finally:
+        shutil.rmtree(workdir)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0]))
+            writer.writeheader()
+            writer.writerows(results)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for r in regressions:
+            print(f"Regression: {r['stage']} {r['family']} {r['size']}: "
+                  f"{r['baseline_s'] * 1000:.3f} ms -> {r['median_s'] * 1000:.3f} ms "
+                  f"({r['ratio']:.2f}x)", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
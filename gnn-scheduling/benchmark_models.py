@@ -0,0 +1,169 @@
+import argparse
+import json
+import random
+import sys
+import time
+from typing import Dict, List, Sequence
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch_geometric.loader import DataLoader
+
+from src.conversion import example_to_data
+from src.export import check_gcn_equivalence
+from src.families import FAMILIES, ArrayExample, generate_example
+from src.features import DEFAULT_FEATURES, STRUCTURAL_FEATURES, FeatureConfig
+from src.model import MODELS, Denormalizer, model_transform
+from src.parallel import generate_rows
+from src.precision import PRECISIONS, reduce_precision
+from src.split import examples_metadata, stratified_split
+
+FEATURE_CONFIGS = {
+    "default": DEFAULT_FEATURES,
+    "structural": STRUCTURAL_FEATURES,
+}
+
+
+class _RandomExample:
+    def __init__(self, families: Sequence[str], min_size: int, max_size: int):
+        self.families = families
+        self.min_size = min_size
+        self.max_size = max_size
+
+    def __call__(self, index: int) -> ArrayExample:
+        return generate_example(random.choice(self.families),
+                                random.randint(self.min_size, self.max_size),
+                                worker_count=random.randint(1, 4))
+
+
+def train(model: torch.nn.Module, dataset, epochs: int, batch_size: int) -> float:
+    """
+    Trains the model and returns the training throughput in graphs per second.
+    """
+    optimizer = torch.optim.Adam(model.parameters(), lr=0.001, weight_decay=5e-4)
+    model.train()
+    start = time.perf_counter()
+    for _ in range(epochs):
+        for batch in DataLoader(dataset, batch_size=batch_size, shuffle=True):
+            optimizer.zero_grad()
+            loss = F.mse_loss(model(batch), batch.y.unsqueeze(1))
+            loss.backward()
+            optimizer.step()
+    return len(dataset) * epochs / (time.perf_counter() - start)
+
+
+def evaluate(model: torch.nn.Module, dataset, batch_size: int,
+             latency_samples=100) -> Dict[str, float]:
+    """
+    Returns the inference throughput, the median latency of predicting a single graph and the
+    errors of denormalized predictions.
+    """
+    denormalizer = Denormalizer()
+    batches = list(DataLoader(dataset, batch_size=batch_size))
+    predictions = []
+    targets = []
+    model.eval()
+    with torch.inference_mode():
+        start = time.perf_counter()
+        for batch in batches:
+            predictions.append(denormalizer.denormalize(model(batch), batch))
+        duration = time.perf_counter() - start
+        latencies = []
+        for batch in DataLoader(dataset[:latency_samples], batch_size=1):
+            start = time.perf_counter()
+            model(batch)
+            latencies.append(time.perf_counter() - start)
+        for batch in batches:
+            targets.append(denormalizer.denormalize(batch.y.unsqueeze(1), batch))
+    predictions = torch.cat(predictions).squeeze(1).numpy()
+    targets = torch.cat(targets).squeeze(1).numpy()
+    errors = np.abs(predictions - targets)
+    return {
+        "inference_graphs_per_s": len(dataset) / duration,
+        "latency_ms": float(np.median(latencies)) * 1000,
+        "mae": float(errors.mean()),
+        "mape": float((errors / targets).mean()),
+    }
+
+
+def benchmark_models(models: Sequence[str], train_dataset, val_dataset, epochs: int,
+                     batch_size: int, seed: int,
+                     precisions: Sequence[str] = ("fp32",)) -> List[dict]:
+    """
+    Trains each model and evaluates it on the validation set in each of the `precisions`.
+    Reduced precision results are compared against the float32 model.
+    """
+    precisions = ["fp32"] + [precision for precision in precisions if precision != "fp32"]
+    if "fused-gcn" in models:
+        # The validation graphs are a mix of families and sizes
+        differences = check_gcn_equivalence(val_dataset[:64], seed=seed)
+        print(f"GCN variant differences: {differences}", file=sys.stderr)
+    results = []
+    for name in models:
+        (train_data, val_data) = (train_dataset, val_dataset)
+        transform = model_transform(name)
+        if transform is not None:
+            train_data = [transform(data.clone()) for data in train_data]
+            val_data = [transform(data.clone()) for data in val_data]
+
+        torch.manual_seed(seed)
+        model = MODELS[name](train_data[0].num_features)
+        parameters = sum(p.numel() for p in model.parameters())
+        train_throughput = train(model, train_data, epochs, batch_size)
+        for precision in precisions:
+            result = {
+                "model": name,
+                "precision": precision,
+                "parameters": parameters,
+                "train_graphs_per_s": train_throughput,
+            }
+            result.update(evaluate(reduce_precision(model, precision), val_data, batch_size))
+            if precision == "fp32":
+                baseline = result
+            result["mae_increase"] = result["mae"] - baseline["mae"]
+            result["speedup"] = (result["inference_graphs_per_s"] /
+                                 baseline["inference_graphs_per_s"])
+            results.append(result)
+            print(f"{name:>10} {precision:>9}: train {result['train_graphs_per_s']:.1f} graphs/s, "
+                  f"inference {result['inference_graphs_per_s']:.1f} graphs/s "
+                  f"({result['speedup']:.2f}x), latency {result['latency_ms']:.3f} ms, "
+                  f"MAE {result['mae']:.3f} ({result['mae_increase']:+.3f}), "
+                  f"MAPE {result['mape'] * 100:.2f} %", file=sys.stderr)
+    return results
+
+
+def create_dataset(families: Sequence[str], count: int, min_size: int, max_size: int,
+                   config: FeatureConfig, processes: int, seed: int):
+    rows = list(generate_rows(_RandomExample(families, min_size, max_size), count,
+                              processes=processes, seed=seed))
+    split = stratified_split(examples_metadata(example for (example, _) in rows), seed=seed)
+    dataset = [example_to_data(example, makespan, config=config) for (example, makespan) in rows]
+    return [dataset[i] for i in split.train], [dataset[i] for i in split.validation]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare the throughput and accuracy of models on the same dataset")
+    parser.add_argument("--models", nargs="+", default=list(MODELS), choices=list(MODELS))
+    parser.add_argument("--families", nargs="+", default=list(FAMILIES), choices=list(FAMILIES))
+    parser.add_argument("--count", type=int, default=1000, help="Number of generated graphs")
+    parser.add_argument("--min-size", type=int, default=10)
+    parser.add_argument("--max-size", type=int, default=200)
+    parser.add_argument("--features", default="default", choices=list(FEATURE_CONFIGS))
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--precisions", nargs="+", default=["fp32"], choices=list(PRECISIONS),
+                        help="Inference precisions compared against fp32")
+    parser.add_argument("--output", default="models.json", help="JSON results file")
+    args = parser.parse_args()
+
+    (train_dataset, val_dataset) = create_dataset(args.families, args.count, args.min_size,
+                                                  args.max_size, FEATURE_CONFIGS[args.features],
+                                                  args.processes, args.seed)
+    results = benchmark_models(args.models, train_dataset, val_dataset, args.epochs,
+                               args.batch_size, args.seed, args.precisions)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
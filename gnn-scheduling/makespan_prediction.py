@@ -1,183 +1,55 @@
-import json
+import os
 import random
-from typing import List
+from typing import List, Optional
 
 import numpy as np
 import pandas as pd
 import pytorch_lightning as pl
 import torch
-import torch.nn.functional as F
 import torchmetrics
 from estee.generators.irw import mapreduce
-from estee.serialization.dask_json import deserialize_graph, serialize_graph
-from kitt.data import train_test_split
 from torch_geometric.data import Data
-from torch_geometric.loader import DataLoader
-from torch_geometric.nn import GCNConv, global_add_pool, global_max_pool, global_mean_pool
-from torchmetrics import MeanAbsoluteError
 
-from src.conversion import estee_to_pyg
+from src.bounds import bounds_frame
+from src.cache import ConversionCache, cached_example_to_data
 from src.data import TrainExample
-from src.generator import simulate_graph
-from src.utils import timer
+from src.dataset import generate_incremental, load_dataset
+from src.export import export_model
+from src.features import DEFAULT_FEATURES, FeatureConfig
+from src.instrumentation import INSTRUMENTATION, count, phase
+from src.model import Denormalizer, MakespanPredictor, model_transform
+from src.pipeline import make_loader
+from src.sampler import NodeBudgetBatchSampler
+from src.simcache import SimulationCache
+from src.split import examples_metadata, stratified_split
 
 
-class Denormalizer:
-    def denormalize(self, value, batch):
-        return value * batch.normalization_factor.unsqueeze(1)
-
-
-def df_to_geometric_data(df: pd.DataFrame) -> List[Data]:
-    dataset = []
-    for row in range(len(df)):
-        example = df["example"].iloc[row]
-        graph = example.graph
-        makespan = df["makespan"].iloc[row]
-        (node_features, edge_index) = estee_to_pyg(example)
-
-        max_duration = max(t.duration for t in graph.tasks.values())
-        node_features = node_features / max_duration
-        makespan = makespan / max_duration
+def df_to_geometric_data(df: pd.DataFrame, validate=False,
+                         cache: Optional[ConversionCache] = None,
+                         config: FeatureConfig = DEFAULT_FEATURES) -> List[Data]:
+    return [cached_example_to_data(cache, example, makespan, validate=validate, config=config)
+            for (example, makespan) in zip(df["example"], df["makespan"])]
 
-        data = Data(x=node_features, edge_index=edge_index,
-                    y=torch.tensor([makespan], dtype=torch.float32),
-                    normalization_factor=max_duration)
-        dataset.append(data)
-    return dataset
 
+def generate_example_1(index: int) -> TrainExample:
+    # example = merge_neighbours(np.random.randint(5, 25))
+    # example = merge_neighbours(5)
+    worker_count = random.randint(1, 2)
+    task_count = 5#random.randint(3, 50)
+    graph = mapreduce(task_count)
+    return TrainExample(graph=graph, worker_count=worker_count, family="mapreduce")
 
-class GCN(torch.nn.Module):
-    def __init__(self, num_features: int):
-        super().__init__()
-        self.conv1 = GCNConv(num_features, 32, flow="target_to_source")
-        self.conv2 = GCNConv(num_features, 32, flow="source_to_target")
-        self.conv3 = GCNConv(64, 64)
-        self.node_head1 = torch.nn.Linear(64, 32)
-        self.graph_head = torch.nn.Linear(96, 1)
-
-    def forward(self, data):
-        x, edge_index = data.x, data.edge_index
-
-        input = x
+    # task_count = random.randint(3, 50)
+    # return TrainExample(graph=triplets(task_count, cpus=1), worker_count=1)
 
-        x1 = self.conv1(input, edge_index)
-        x2 = self.conv2(input, edge_index)
 
-        x = torch.cat([x1, x2], axis=-1)
-        x = F.relu(x)
+class GraphCounter(pl.Callback):
+    """
+    Counts the graphs of all training batches into the current instrumentation phase.
+    """
 
-        x = self.conv3(x, edge_index)
-        x = F.relu(x)
-
-        x = self.node_head1(x)
-        x = F.relu(x)
-
-        sum = global_add_pool(x, data.batch)
-        mean = global_mean_pool(x, data.batch)
-        max = global_max_pool(x, data.batch)
-
-        x = torch.cat([sum, mean, max], axis=1)
-        x = self.graph_head(x)
-        return x
-
-
-class MakespanPredictor(pl.LightningModule):
-    def __init__(self, num_features: int, learning_rate: float, denormalizer: Denormalizer):
-        super().__init__()
-        self.module = GCN(num_features)
-        self.learning_rate = learning_rate
-        self.denormalizer = denormalizer
-        self.mae = MeanAbsoluteError()
-
-    def forward(self, x):
-        return self.module(x)
-
-    def configure_optimizers(self):
-        return torch.optim.Adam(self.parameters(), lr=self.learning_rate, weight_decay=5e-4)
-
-    def training_step(self, train_batch, batch_idx):
-        return self.step(train_batch, "loss")[2]
-
-    def validation_step(self, val_batch, batch_idx):
-        with torch.inference_mode():
-            pred, gt, loss = self.step(val_batch, "val_loss")
-            pred_dn = self.denormalizer.denormalize(pred, val_batch)
-            gt_dn = self.denormalizer.denormalize(gt, val_batch)
-            acc = self.mae(pred_dn, gt_dn)
-            self.log("val_mae", acc, prog_bar=True)
-
-    def step(self, batch: Data, loss_name: str):
-        pred = self.module(batch)
-        gt = batch.y.unsqueeze(1)
-        loss = F.mse_loss(pred, gt)
-        prog_bar = "val" in loss_name
-        self.log(loss_name, loss, prog_bar=prog_bar)
-        return pred, gt, loss
-
-
-def save_dataset(path: str, dataset: pd.DataFrame):
-    examples = []
-    for example in dataset["example"]:
-        graph = serialize_graph(example.graph)
-        examples.append({
-            "graph": graph,
-            "worker_count": example.worker_count
-        })
-
-    makespans = list(dataset["makespan"])
-    data = {
-        "examples": examples,
-        "makespans": makespans
-    }
-
-    with open(path, "w") as f:
-        f.write(json.dumps(data))
-
-
-def load_dataset(path: str) -> pd.DataFrame:
-    with open(path) as f:
-        data = json.load(f)
-
-        examples = []
-        for example in data["examples"]:
-            graph = deserialize_graph(example["graph"])
-            examples.append(TrainExample(graph, example["worker_count"]))
-
-        return pd.DataFrame({
-            "example": examples,
-            "makespan": data["makespans"]
-        })
-
-
-def create_dataframe(examples: List[TrainExample]):
-    makespans = []
-    for example in examples:
-        makespans.append(simulate_graph(example))
-
-    return pd.DataFrame({
-        "example": examples,
-        "makespan": makespans
-    })
-
-
-def generate_dataset_1(count=100) -> pd.DataFrame:
-    examples = []
-
-    for i in range(count):
-        # example = merge_neighbours(np.random.randint(5, 25))
-        # example = merge_neighbours(5)
-        worker_count = random.randint(1, 2)
-        task_count = 5#random.randint(3, 50)
-        graph = mapreduce(task_count)
-        example = TrainExample(graph=graph, worker_count=worker_count)
-        examples.append(example)
-
-    # for i in range(count):
-    #     task_count = random.randint(3, 50)
-    #     example = TrainExample(graph=triplets(task_count, cpus=1), worker_count=1)
-    #     examples.append(example)
-
-    return create_dataframe(examples)
+    def on_train_batch_end(self, trainer, pl_module, outputs, batch, batch_idx, *args):
+        count("graphs", batch.num_graphs)
 
 
 if __name__ == "__main__":
@@ -185,40 +57,80 @@ if __name__ == "__main__":
     np.random.seed(0)
     random.seed(0)
 
-    with timer("generate"):
-        dataset = generate_dataset_1(10)
-        save_dataset("dataset1.json", dataset)
-        # dataset = load_dataset("dataset1.json")
+    processes = os.cpu_count()
+
+    with phase("generate"):
+        # Resumes an interrupted generation, only missing examples are simulated
+        simulation_cache = SimulationCache("simulations.sqlite")
+        count("graphs", generate_incremental("dataset1", generate_example_1, 10,
+                                             processes=processes, cache=simulation_cache))
+    with phase("load"):
+        dataset = load_dataset("dataset1")
+        count("graphs", len(dataset))
+        count("tasks", sum(e.graph.task_count for e in dataset["example"]))
 
     print(dataset.head(5))
 
+    bounds = bounds_frame(dataset["example"])
+    for bound in ("lower", "upper"):
+        error = np.mean(np.abs(bounds[bound] - dataset["makespan"]))
+        print(f"Average {bound} bound error: {error}")
+
     # for graph in dataset["graph"]:
     #     nx_graph = estee_to_nx(graph)
     #     nx.draw_kamada_kawai(nx_graph)
     #     plt.show()
     #     exit()
 
-    with timer("convert"):
-        dataset = df_to_geometric_data(dataset)
+    # Splits by graph family, size and worker count without leaking graphs into validation
+    split = stratified_split(examples_metadata(dataset["example"]), validation=0.2)
+
+    with phase("convert"):
+        feature_config = DEFAULT_FEATURES
+        cache = ConversionCache("dataset1.cache", config=feature_config)
+        dataset = df_to_geometric_data(dataset, validate=True, cache=cache, config=feature_config)
+        count("graphs", len(dataset))
+        count("tasks", sum(data.num_nodes for data in dataset))
+
+    # One of src.model.MODELS, "fused-gcn" computes the same function as "gcn", faster on
+    # large graphs
+    model_name = "gcn"
+    transform = model_transform(model_name)
+    if transform is not None:
+        dataset = [transform(data) for data in dataset]
 
-    train_dataset, val_dataset = train_test_split(dataset, 0.2)
+    train_dataset = [dataset[i] for i in split.train]
+    val_dataset = [dataset[i] for i in split.validation]
 
     batch_size = 64
-    train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True)
+    # Number of background processes that load and collate batches
+    num_workers = 0
+    # Limits the total number of nodes in a batch instead of the number of graphs
+    max_batch_nodes = None
+    if max_batch_nodes is not None:
+        sampler = NodeBudgetBatchSampler.for_dataset(train_dataset, max_nodes=max_batch_nodes)
+        train_loader = make_loader(train_dataset, batch_sampler=sampler, num_workers=num_workers)
+    else:
+        train_loader = make_loader(train_dataset, batch_size=batch_size, shuffle=True,
+                                   num_workers=num_workers)
     if val_dataset:
-        val_loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=False)
+        val_loader = make_loader(val_dataset, batch_size=batch_size, shuffle=False,
+                                 num_workers=num_workers)
     else:
         val_loader = None
 
     learning_rate = 0.001
     denormalizer = Denormalizer()
     model = MakespanPredictor(dataset[0].num_features, learning_rate=learning_rate,
-                              denormalizer=denormalizer)
+                              denormalizer=denormalizer, features=feature_config.features,
+                              model=model_name)
 
     gpus = None
     max_epochs = 1500
-    trainer = pl.Trainer(gpus=gpus, max_epochs=max_epochs, log_every_n_steps=batch_size)
-    trainer.fit(model, train_loader, val_loader)
+    trainer = pl.Trainer(gpus=gpus, max_epochs=max_epochs, log_every_n_steps=batch_size,
+                         callbacks=[GraphCounter()])
+    with phase("train"):
+        trainer.fit(model, train_loader, val_loader)
 
     mae = torchmetrics.MeanAbsoluteError()
     model.eval()
@@ -239,11 +151,19 @@ if __name__ == "__main__":
         print(f"Average error: {np.mean(errors)}")
 
 
-    print("Train")
-    eval_dataset(train_loader)
-    if val_loader:
-        print("Val")
-        eval_dataset(val_loader)
+    with phase("evaluate"):
+        print("Train")
+        eval_dataset(train_loader)
+        if val_loader:
+            print("Val")
+            eval_dataset(val_loader)
+
+    # Weights, feature schema and a TorchScript module for fast-loading inference
+    export_model(model, "makespan-model", samples=(val_dataset or train_dataset)[:16])
+
+    print(INSTRUMENTATION.report())
+    INSTRUMENTATION.to_json("profile.json")
+    INSTRUMENTATION.to_chrome_trace("trace.json")
 
 # 1000 graphs, 100 epochs, LR 0.001: 0.33750963
 # 1000 graphs, 100 epochs, LR 0.01: 0.21409684
@@ -0,0 +1,42 @@
+import dataclasses
+from typing import Iterable
+
+import pandas as pd
+
+from .conversion import example_structure
+from .data import TrainExample
+from .features import GraphStructure
+
+
+@dataclasses.dataclass(frozen=True)
+class MakespanBounds:
+    critical_path: float
+    # Total work divided by the number of worker cpus
+    work: float
+    # max(critical path, work), no schedule can be shorter
+    lower: float
+    # Graham's list-scheduling bound, any greedy schedule without transfer costs is shorter
+    upper: float
+
+
+def structure_bounds(structure: GraphStructure, worker_count: int,
+                     cpus_per_worker=1) -> MakespanBounds:
+    return MakespanBounds(
+        critical_path=structure.critical_path_length,
+        work=structure.work_bound(worker_count, cpus_per_worker),
+        lower=structure.lower_bound(worker_count, cpus_per_worker),
+        upper=structure.upper_bound(worker_count, cpus_per_worker)
+    )
+
+
+def makespan_bounds(example: TrainExample, cpus_per_worker=1) -> MakespanBounds:
+    return structure_bounds(example_structure(example), example.worker_count, cpus_per_worker)
+
+
+def bounds_frame(examples: Iterable[TrainExample], cpus_per_worker=1) -> pd.DataFrame:
+    """
+    Returns a DataFrame with a row of bounds for each example, e.g. to be used as a baseline
+    next to simulated makespans.
+    """
+    return pd.DataFrame([dataclasses.asdict(makespan_bounds(example, cpus_per_worker))
+                         for example in examples])
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+from typing import Optional
+
+import torch
+from estee.common import TaskGraph
+from estee.serialization.dask_json import serialize_graph
+from torch_geometric.data import Data
+
+from .conversion import example_to_data
+from .data import TrainExample
+from .families import ArrayExample
+from .features import DEFAULT_FEATURES, FeatureConfig
+
+# Bump when the conversion changes in a way that invalidates cached entries
+CONVERSION_VERSION = 1
+
+
+def graph_digest(graph: TaskGraph) -> str:
+    serialized = json.dumps(serialize_graph(graph), sort_keys=True)
+    return hashlib.sha256(serialized.encode()).hexdigest()
+
+
+def example_digest(example: TrainExample) -> str:
+    if isinstance(example, ArrayExample):
+        return example.arrays.digest()
+    return graph_digest(example.graph)
+
+
+class ConversionCache:
+    """
+    On-disk cache of converted graphs, keyed by a hash of the serialized graph, the worker count
+    and the feature config.
+
+    Every entry is a single file. Reading an entry refreshes its modification time and when the
+    total size exceeds `max_bytes`, the least recently used entries are removed.
+    """
+
+    def __init__(self, directory: str, max_bytes=1024 ** 3,
+                 config: FeatureConfig = DEFAULT_FEATURES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.config = config
+        self.config_digest = hashlib.sha256(json.dumps(
+            {"version": CONVERSION_VERSION, "config": config.to_dict()}, sort_keys=True
+        ).encode()).hexdigest()
+        os.makedirs(directory, exist_ok=True)
+        self.size = sum(entry.stat().st_size for entry in os.scandir(directory)
+                        if entry.name.endswith(".pt"))
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, example: TrainExample) -> str:
+        content = f"{self.config_digest}:{example_digest(example)}:{example.worker_count}"
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pt")
+
+    def get(self, key: str) -> Optional[dict]:
+        path = self.path(key)
+        try:
+            entry = torch.load(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        os.utime(path)
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, entry: dict):
+        path = self.path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        torch.save(entry, tmp_path)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+        self.size += size
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries, leaving some free space so that eviction
+        does not run on every insert.
+        """
+        entries = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                         for entry in os.scandir(self.directory) if entry.name.endswith(".pt"))
+        self.size = sum(size for (_, size, _) in entries)
+        target = int(self.max_bytes * 0.9)
+        for (_, size, path) in entries:
+            if self.size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.size -= size
+
+
+def cached_example_to_data(cache: Optional[ConversionCache], example: TrainExample,
+                           makespan: float, validate=False,
+                           config: FeatureConfig = DEFAULT_FEATURES) -> Data:
+    if cache is None:
+        return example_to_data(example, makespan, validate=validate, config=config)
+    assert cache.config == config
+
+    key = cache.key(example)
+    entry = cache.get(key)
+    if entry is None:
+        data = example_to_data(example, makespan, validate=validate, config=config)
+        cache.put(key, {
+            "x": data.x,
+            "edge_index": data.edge_index,
+            "normalization_factor": data.normalization_factor
+        })
+        return data
+
+    normalization_factor = entry["normalization_factor"]
+    return Data(x=entry["x"], edge_index=entry["edge_index"],
+                y=torch.tensor([makespan / normalization_factor], dtype=torch.float32),
+                normalization_factor=normalization_factor)
@@ -1,44 +1,117 @@
-from collections import deque
-from itertools import chain
+from typing import Sequence, Tuple
 
 import networkx as nx
+import numpy as np
 import torch
 from estee.common import TaskGraph
+from torch_geometric.data import Data
 
 from .data import TrainExample
+from .families import ArrayExample
+from .features import (DEFAULT_FEATURES, FeatureConfig, GraphStructure, extract_features,
+                       normalize_features)
 
 
-def estee_to_pyg(example: TrainExample):
+def graph_to_arrays(graph: TaskGraph) -> Tuple[np.ndarray, np.ndarray]:
     """
-    Returns (node_features, edge_index)
+    Returns (durations, edges), where `durations` is indexed by task id and `edges` is a
+    (2, edge_count) array of unique (producer id, consumer id) pairs, sorted by producer.
     """
-    graph = example.graph
-    edges_from = []
-    edges_to = []
-    features = [None] * len(graph.tasks)
+    tasks = graph.tasks.values()
+    task_count = len(graph.tasks)
+    ids = np.fromiter((t.id for t in tasks), dtype=np.int64, count=task_count)
+    durations = np.empty(task_count, dtype=np.float32)
+    durations[ids] = np.fromiter((t.duration for t in tasks), dtype=np.float32, count=task_count)
 
-    to_visit = deque(graph.source_tasks())
-    visited = set()
-    while to_visit:
-        node = to_visit.popleft()
-        if node in visited:
-            continue
-        visited.add(node)
-        consumers = list(chain.from_iterable(o.consumers for o in node.outputs))
-        feats = [node.duration, example.worker_count]
-        features[node.id] = feats
-        for consumer in consumers:
-            if consumer not in visited:
-                edges_from.append(node.id)
-                edges_to.append(consumer.id)
-                to_visit.append(consumer)
+    # A task can pass several outputs to the same consumer, but it is still a single dependency
+    keys = np.fromiter((t.id * task_count + c.id
+                        for t in tasks
+                        for o in t.outputs
+                        for c in o.consumers), dtype=np.int64)
+    keys = np.unique(keys)
+    edges = np.stack((keys // task_count, keys % task_count))
+    return durations, edges
 
-    assert len(edges_from) == len(edges_to)
-    edge_index = torch.tensor([edges_from, edges_to], dtype=torch.long)
 
-    node_features = torch.tensor(features, dtype=torch.float)
+def example_structure(example: TrainExample) -> GraphStructure:
+    """
+    Returns the structure of an example, without building a task graph for an `ArrayExample`.
+    """
+    if isinstance(example, ArrayExample):
+        return example.arrays.structure()
+    (durations, edges) = graph_to_arrays(example.graph)
+    return GraphStructure(durations, edges, example.graph)
+
+
+def check_edges(graph: TaskGraph, edge_index: torch.Tensor):
+    """
+    Checks that `edge_index` contains every producer -> consumer dependency of `graph` exactly
+    once. The dependencies are read from task inputs, independently of the conversion.
+    """
+    expected = {(i.parent.id, t.id) for t in graph.tasks.values() for i in t.inputs}
+    edges = [tuple(e) for e in edge_index.t().tolist()]
+    if len(edges) != len(expected):
+        raise ValueError(f"Converted graph has {len(edges)} edges, "
+                         f"but the task graph has {len(expected)} dependencies")
+    if set(edges) != expected:
+        missing = expected.difference(edges)
+        raise ValueError(f"Converted graph does not match the task graph, "
+                         f"missing dependencies: {sorted(missing)}")
+
+
+def estee_to_pyg(example: TrainExample, config: FeatureConfig = DEFAULT_FEATURES):
+    """
+    Returns (node_features, edge_index), node features are not normalized.
+    """
+    structure = example_structure(example)
+    node_features = extract_features(structure, example.worker_count, config)
+    return (torch.from_numpy(node_features),
+            torch.from_numpy(np.ascontiguousarray(structure.edges)))
+
+
+def estee_to_pyg_batch(examples: Sequence[TrainExample],
+                       config: FeatureConfig = DEFAULT_FEATURES):
+    """
+    Converts several examples into a single block of tensors, with node ids offset by the
+    position of each graph in the block.
+    Returns (node_features, edge_index, ptr), nodes of the i-th graph are `ptr[i]:ptr[i + 1]`.
+    """
+    structures = [example_structure(example) for example in examples]
+    node_counts = np.fromiter((s.task_count for s in structures), dtype=np.int64,
+                              count=len(structures))
+    edge_counts = np.fromiter((s.edges.shape[1] for s in structures), dtype=np.int64,
+                              count=len(structures))
+    ptr = np.zeros(len(structures) + 1, dtype=np.int64)
+    np.cumsum(node_counts, out=ptr[1:])
+    edge_ptr = np.zeros(len(structures) + 1, dtype=np.int64)
+    np.cumsum(edge_counts, out=edge_ptr[1:])
+
+    node_features = np.empty((ptr[-1], config.num_features), dtype=np.float32)
+    edge_index = np.empty((2, edge_ptr[-1]), dtype=np.int64)
+    for (i, (example, structure)) in enumerate(zip(examples, structures)):
+        extract_features(structure, example.worker_count, config,
+                         out=node_features[ptr[i]:ptr[i + 1]])
+        np.add(structure.edges, ptr[i], out=edge_index[:, edge_ptr[i]:edge_ptr[i + 1]])
+
+    return torch.from_numpy(node_features), torch.from_numpy(edge_index), torch.from_numpy(ptr)
+
+
+def example_to_data(example: TrainExample, makespan: float, validate=False,
+                    config: FeatureConfig = DEFAULT_FEATURES) -> Data:
+    structure = example_structure(example)
+    edge_index = torch.from_numpy(np.ascontiguousarray(structure.edges))
+    # Array examples are not validated, their arrays are the source of the task graph
+    if validate and not isinstance(example, ArrayExample):
+        check_edges(example.graph, edge_index)
+
+    max_duration = float(structure.durations.max())
+    node_features = extract_features(structure, example.worker_count, config)
+    node_features = normalize_features(node_features, config, max_duration)
+    makespan = makespan / max_duration
 
-    return node_features, edge_index
+    return Data(x=torch.from_numpy(node_features), edge_index=edge_index,
+                y=torch.tensor([makespan], dtype=torch.float32),
+                normalization_factor=max_duration)
 
 
 def estee_to_nx(graph: TaskGraph) -> nx.DiGraph:
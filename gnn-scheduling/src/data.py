@@ -1,4 +1,5 @@
 import dataclasses
+from typing import Optional
 
 from estee.common import TaskGraph
 
@@ -7,3 +8,5 @@ from estee.common import TaskGraph
 class TrainExample:
     graph: TaskGraph
     worker_count: int
+    # Name of the generator that created the graph
+    family: Optional[str] = None
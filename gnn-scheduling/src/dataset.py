@@ -0,0 +1,288 @@
+import glob
+import json
+import os
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union
+
+import pandas as pd
+import torch
+from estee.serialization.dask_json import deserialize_graph, serialize_graph
+
+from .conversion import example_to_data
+from .data import TrainExample
+from .hashing import dedupe_examples, example_hash, weighted_hash
+from .instrumentation import count as count_metric
+from .parallel import generate_rows, simulate_examples
+from .simcache import SimulationCache
+
+Row = Tuple[TrainExample, float]
+
+SHARD_PATTERN = "shard-{:05}.jsonl"
+# Hashes, sizes, families, worker counts and generation indices of the rows of a shard
+META_SUFFIX = ".meta.json"
+TMP_SUFFIX = ".tmp"
+
+
+class DatasetWriter:
+    """
+    Writes (example, makespan) rows into a directory of JSON Lines shards.
+    Every row is serialized and written as soon as it arrives, so memory usage does not depend
+    on the size of the dataset.
+
+    A shard is first written into a temporary file and only renamed to its final name once it
+    is complete, so after a crash the directory contains only fully written shards.
+    With `append`, new shards are added after the existing ones, otherwise existing shards are
+    removed. With `dedupe`, rows whose graph (compared by its canonical hash) and worker count
+    are already in the dataset are skipped.
+    """
+
+    def __init__(self, path: str, shard_size=1000, append=False, dedupe=False):
+        self.path = path
+        self.shard_size = shard_size
+        self.dedupe = dedupe
+        self.file = None
+        self.shard_rows = []
+        self.bytes_written = 0
+        os.makedirs(path, exist_ok=True)
+
+        for tmp_file in glob.glob(os.path.join(path, f"*{TMP_SUFFIX}")):
+            os.remove(tmp_file)
+        shards = shard_paths(path)
+        if not append:
+            for shard in shards:
+                os.remove(shard)
+                if os.path.isfile(meta_path(shard)):
+                    os.remove(meta_path(shard))
+            shards = []
+        self.shard_index = shard_number(shards[-1]) + 1 if shards else 0
+        self.seen = set()
+        if dedupe:
+            self.seen = {(row["hash"], row["worker_count"]) for row in dataset_meta(path)}
+
+    def write(self, example: TrainExample, makespan: float, index: Optional[int] = None,
+              seed: Optional[int] = None) -> bool:
+        """
+        Writes a row, returns False if it was skipped as a duplicate.
+        """
+        row = serialize_row(example, makespan)
+        key = (row["hash"], row["worker_count"])
+        if self.dedupe:
+            if key in self.seen:
+                return False
+            self.seen.add(key)
+        if index is not None:
+            row["index"] = index
+            row["seed"] = seed
+
+        if self.file is None:
+            self.file = open(self.shard_path + TMP_SUFFIX, "w")
+        line = json.dumps(row) + "\n"
+        self.file.write(line)
+        self.bytes_written += len(line)
+        self.shard_rows.append(row_meta(row))
+        if len(self.shard_rows) >= self.shard_size:
+            self.finish_shard()
+        return True
+
+    @property
+    def shard_path(self) -> str:
+        return os.path.join(self.path, SHARD_PATTERN.format(self.shard_index))
+
+    def finish_shard(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            path = self.shard_path
+            with open(meta_path(path) + TMP_SUFFIX, "w") as f:
+                json.dump(self.shard_rows, f)
+            os.replace(meta_path(path) + TMP_SUFFIX, meta_path(path))
+            os.replace(path + TMP_SUFFIX, path)
+            self.shard_index += 1
+            self.shard_rows = []
+
+    def close(self):
+        self.finish_shard()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def serialize_row(example: TrainExample, makespan: float):
+    row = {
+        "graph": serialize_graph(example.graph),
+        "hash": example_hash(example),
+        "task_count": example.graph.task_count,
+        "worker_count": example.worker_count,
+        "makespan": makespan
+    }
+    if example.family is not None:
+        row["family"] = example.family
+    return row
+
+
+def deserialize_row(data) -> Row:
+    graph = deserialize_graph(data["graph"])
+    return TrainExample(graph, data["worker_count"], data.get("family")), data["makespan"]
+
+
+def row_meta(row) -> dict:
+    meta = {"hash": row.get("hash") or weighted_hash(deserialize_graph(row["graph"])),
+            "task_count": row.get("task_count", len(row["graph"])),
+            "family": row.get("family"),
+            "worker_count": row["worker_count"]}
+    if "index" in row:
+        meta["index"] = row["index"]
+        meta["seed"] = row["seed"]
+    return meta
+
+
+def meta_path(shard_path: str) -> str:
+    return shard_path[:-len(".jsonl")] + META_SUFFIX
+
+
+def shard_number(shard_path: str) -> int:
+    return int(os.path.basename(shard_path)[len("shard-"):-len(".jsonl")])
+
+
+def shard_paths(path: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(path, SHARD_PATTERN.replace("{:05}", "*"))))
+
+
+def iter_shard(path: str) -> Iterator[Row]:
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield deserialize_row(json.loads(line))
+
+
+def read_shard_meta(shard_path: str) -> List[dict]:
+    path = meta_path(shard_path)
+    if os.path.isfile(path):
+        with open(path) as f:
+            return json.load(f)
+    with open(shard_path) as f:
+        return [row_meta(json.loads(line)) for line in f if line.strip()]
+
+
+def dataset_meta(path: str) -> List[dict]:
+    """
+    Returns the metadata (graph hash, task count, family, worker count and generation index)
+    of all rows of a dataset without deserializing the graphs.
+    """
+    return [meta for shard in shard_paths(path) for meta in read_shard_meta(shard)]
+
+
+def dataset_metadata(path: str) -> pd.DataFrame:
+    """
+    Returns the metadata of all rows of a dataset as a DataFrame, in the order of the rows.
+    """
+    return pd.DataFrame(dataset_meta(path), columns=["hash", "task_count", "family",
+                                                     "worker_count", "index", "seed"])
+
+
+def iter_dataset(path: str) -> Iterator[Row]:
+    """
+    Lazily yields (example, makespan) rows of a dataset, one shard after another.
+    """
+    if os.path.isfile(path):
+        yield from iter_legacy_dataset(path)
+        return
+    for shard in shard_paths(path):
+        yield from iter_shard(shard)
+
+
+def iter_legacy_dataset(path: str) -> Iterator[Row]:
+    """
+    Reads the original single-file JSON format.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    for (example, makespan) in zip(data["examples"], data["makespans"]):
+        yield TrainExample(deserialize_graph(example["graph"]), example["worker_count"]), makespan
+
+
+def save_dataset(path: str, dataset: Union[pd.DataFrame, Iterable[Row]], shard_size=1000):
+    if isinstance(dataset, pd.DataFrame):
+        dataset = zip(dataset["example"], dataset["makespan"])
+    with DatasetWriter(path, shard_size=shard_size) as writer:
+        for (example, makespan) in dataset:
+            writer.write(example, makespan)
+    count_metric("bytes_written", writer.bytes_written)
+
+
+def generate_incremental(path: str, generate: Callable[[int], TrainExample], count: int,
+                         processes: Optional[int] = 1, seed=0, shard_size=1000,
+                         dedupe=True, cache: Optional[SimulationCache] = None) -> int:
+    """
+    Generates and simulates examples with indices `0..count` into a sharded dataset, committing
+    every `shard_size` rows.
+
+    Indices that were already committed for the same `seed` are skipped, so an interrupted run
+    resumes after its last complete shard and a later call with a larger `count` or a different
+    `seed` appends new examples to the dataset. Since every example is generated with random
+    generators seeded by (seed, index), a resumed run produces the same examples as an
+    uninterrupted one. With `dedupe`, examples already present in the dataset are dropped.
+
+    Returns the number of written rows.
+    """
+    indices = [meta["index"] for meta in dataset_meta(path) if meta.get("seed") == seed]
+    start = max(indices) + 1 if indices else 0
+    written = 0
+    with DatasetWriter(path, shard_size=shard_size, append=True, dedupe=dedupe) as writer:
+        rows = generate_rows(generate, count, processes=processes, seed=seed, start=start,
+                             cache=cache)
+        for (index, (example, makespan)) in enumerate(rows, start):
+            written += writer.write(example, makespan, index=index, seed=seed)
+    count_metric("bytes_written", writer.bytes_written)
+    return written
+
+
+def rows_to_dataframe(rows: Iterable[Row]) -> pd.DataFrame:
+    examples = []
+    makespans = []
+    for (example, makespan) in rows:
+        examples.append(example)
+        makespans.append(makespan)
+
+    return pd.DataFrame({
+        "example": examples,
+        "makespan": makespans
+    })
+
+
+def create_dataframe(examples: List[TrainExample], processes: Optional[int] = 1, seed=0,
+                     cache: Optional[SimulationCache] = None, dedupe=False) -> pd.DataFrame:
+    """
+    Simulates examples that are already in memory into an (example, makespan) frame.
+    """
+    if dedupe:
+        examples = dedupe_examples(examples)
+    makespans = simulate_examples(examples, processes=processes, seed=seed, cache=cache)
+    return rows_to_dataframe(zip(examples, makespans))
+
+
+def load_dataset(path: str) -> pd.DataFrame:
+    return rows_to_dataframe(iter_dataset(path))
+
+
+class StreamingGraphDataset(torch.utils.data.IterableDataset):
+    """
+    Streams PyG `Data` objects from a sharded dataset.
+    Shards are parsed lazily, so training can start as soon as the first shard is read.
+    When used with multiple DataLoader workers, each worker reads a disjoint subset of shards.
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+
+    def __iter__(self):
+        shards = shard_paths(self.path)
+        worker = torch.utils.data.get_worker_info()
+        if worker is not None:
+            shards = shards[worker.id::worker.num_workers]
+        for shard in shards:
+            for (example, makespan) in iter_shard(shard):
+                yield example_to_data(example, makespan)
@@ -0,0 +1,178 @@
+import json
+import os
+from typing import Dict, Optional, Sequence
+
+import torch
+import torch.nn.functional as F
+from torch_geometric.data import Batch, Data
+
+from .exported import EXPORT_VERSION, MODEL_FILE, SCHEMA_FILE, WEIGHTS_FILE, batch_tensors
+from .features import FEATURES, FeatureConfig
+from .model import (GCN, GCN_NORM_FLOW, MODELS, FusedGCN, MakespanPredictor,
+                    PrecomputeAdjacency, conv_weight)
+
+
+class ScriptableGCN(torch.nn.Module):
+    """
+    The forward pass of `GCN` (or `FusedGCN`) written with core PyTorch operations only, so
+    that it can be compiled by `torch.jit.script` and evaluated without PyG.
+    Takes (x, edge_index, ptr) of a batch and returns normalized predictions.
+    The "target_to_source" layer is normalized like `GCNConv` of the PyG version used for the
+    export (see `GCN_NORM_FLOW`).
+    """
+
+    def __init__(self, gcn: GCN):
+        super().__init__()
+        self.flow_normalization = GCN_NORM_FLOW
+        for (name, conv) in (("conv1", gcn.conv1), ("conv2", gcn.conv2), ("conv3", gcn.conv3)):
+            self.register_buffer(f"{name}_weight", conv_weight(conv).detach().clone())
+            self.register_buffer(f"{name}_bias", conv.bias.detach().clone())
+        self.node_head1 = torch.nn.Linear(64, 32)
+        self.node_head1.load_state_dict(gcn.node_head1.state_dict())
+        self.graph_head = torch.nn.Linear(96, 1)
+        self.graph_head.load_state_dict(gcn.graph_head.state_dict())
+
+    def forward(self, x: torch.Tensor, edge_index: torch.Tensor,
+                ptr: torch.Tensor) -> torch.Tensor:
+        num_nodes = x.size(0)
+        loops = torch.arange(num_nodes, device=x.device)
+        src = torch.cat([edge_index[0], loops])
+        dst = torch.cat([edge_index[1], loops])
+        out_norm = torch.bincount(src, minlength=num_nodes).to(x.dtype).pow(-0.5)
+        in_norm = torch.bincount(dst, minlength=num_nodes).to(x.dtype).pow(-0.5)
+        # "target_to_source" aggregates into producers, "source_to_target" into consumers
+        forward_weight = (in_norm[src] * in_norm[dst]).unsqueeze(1)
+        backward_weight = forward_weight
+        if self.flow_normalization:
+            backward_weight = (out_norm[src] * out_norm[dst]).unsqueeze(1)
+
+        h = x @ self.conv1_weight
+        x1 = torch.zeros_like(h).index_add_(0, src, h[dst] * backward_weight) + self.conv1_bias
+        h = x @ self.conv2_weight
+        x2 = torch.zeros_like(h).index_add_(0, dst, h[src] * forward_weight) + self.conv2_bias
+        x = F.relu(torch.cat([x1, x2], dim=-1))
+
+        h = x @ self.conv3_weight
+        x = torch.zeros_like(h).index_add_(0, dst, h[src] * forward_weight) + self.conv3_bias
+        x = F.relu(x)
+
+        x = F.relu(self.node_head1(x))
+
+        counts = ptr[1:] - ptr[:-1]
+        batch = torch.repeat_interleave(torch.arange(counts.size(0), device=x.device), counts)
+        sum = torch.zeros(counts.size(0), x.size(1), dtype=x.dtype,
+                          device=x.device).index_add_(0, batch, x)
+        mean = sum / counts.clamp(min=1).unsqueeze(1).to(x.dtype)
+        max = torch.segment_reduce(x, "max", lengths=counts)
+        return self.graph_head(torch.cat([sum, mean, max], dim=1))
+
+
+def check_gcn_equivalence(samples: Sequence[Data], tolerance=1e-4, seed=0) -> Dict[str, float]:
+    """
+    Checks that `FusedGCN` (with and without `PrecomputeAdjacency`) and `ScriptableGCN`
+    compute the same function as `GCN`, which guards their hand-written normalization and
+    flow directions. All models share random parameters (including the biases, which are
+    initialized to zero) and are evaluated on a single batch of `samples`, which should mix
+    graphs of different shapes and sizes.
+
+    Returns the largest difference of each variant relative to the largest `GCN` prediction
+    and raises a `ValueError` if any of them exceeds `tolerance`.
+    """
+    gcn = GCN(samples[0].num_features).eval()
+    generator = torch.Generator().manual_seed(seed)
+    with torch.no_grad():
+        for parameter in gcn.parameters():
+            parameter.copy_(torch.randn(parameter.shape, generator=generator) * 0.5)
+    fused = FusedGCN(samples[0].num_features).eval()
+    fused.load_state_dict(gcn.state_dict())
+    script = torch.jit.script(ScriptableGCN(gcn))
+
+    transform = PrecomputeAdjacency()
+    batch = Batch.from_data_list(list(samples))
+    precomputed = Batch.from_data_list([transform(data.clone()) for data in samples])
+    (x, edge_index, ptr) = batch_tensors(samples)
+    with torch.inference_mode():
+        expected = gcn(batch)
+        outputs = {
+            "fused-gcn": fused(batch),
+            "fused-gcn-precomputed": fused(precomputed),
+            "torchscript": script(x, edge_index, ptr),
+        }
+    scale = max(float(expected.abs().max()), 1.0)
+    differences = {name: float((output - expected).abs().max()) / scale
+                   for (name, output) in outputs.items()}
+    failed = {name: difference for (name, difference) in differences.items()
+              if difference > tolerance}
+    if failed:
+        raise ValueError(f"GCN variants differ from GCN: {failed}")
+    return differences
+
+
+def _model_name(predictor: MakespanPredictor) -> str:
+    return predictor.hparams.get("model", "gcn")
+
+
+def export_model(predictor: MakespanPredictor, directory: str,
+                 samples: Optional[Sequence[Data]] = None, tolerance=1e-4):
+    """
+    Exports a trained model into `directory`:
+    - `weights.pt`: state dict of the network, loadable with `load_module`
+    - `schema.json`: model name, feature schema and the normalization convention
+    - `model.pt`: TorchScript CPU module (only for GCN models), loadable with
+    `ExportedModel` without importing PyTorch Lightning
+
+    When `samples` are given, the TorchScript module is checked against the eager model on
+    them and a `ValueError` is raised if the predictions differ by more than `tolerance`
+    (relative to the largest prediction). Nothing is written when the check fails.
+    """
+    module = predictor.module.cpu().eval()
+    name = _model_name(predictor)
+    config = FeatureConfig(tuple(predictor.hparams.features))
+    scripted = isinstance(module, GCN)
+
+    # The module is checked before anything is written, so that a failed export does not leave
+    # a schema without its TorchScript module behind
+    script = None
+    if scripted:
+        script = torch.jit.script(ScriptableGCN(module))
+        if samples:
+            (x, edge_index, ptr) = batch_tensors(samples)
+            with torch.inference_mode():
+                expected = module(Batch.from_data_list(list(samples)))
+                actual = script(x, edge_index, ptr)
+            scale = max(float(expected.abs().max()), 1.0)
+            difference = float((expected - actual).abs().max()) / scale
+            if difference > tolerance:
+                raise ValueError(f"TorchScript export differs from the model by {difference}")
+
+    os.makedirs(directory, exist_ok=True)
+    if script is not None:
+        script.save(os.path.join(directory, MODEL_FILE))
+    torch.save(module.state_dict(), os.path.join(directory, WEIGHTS_FILE))
+    with open(os.path.join(directory, SCHEMA_FILE), "w") as f:
+        json.dump({
+            "version": EXPORT_VERSION,
+            "model": name,
+            "num_features": predictor.hparams.num_features,
+            "features": config.to_dict(),
+            # Features normalized by "duration" are divided by the longest task duration of
+            # the graph, "max" features by their maximum in the graph
+            "feature_normalization": {feature: FEATURES[feature].normalization
+                                      for feature in config.features},
+            # Predictions are makespans divided by the longest task duration of the graph
+            "target_normalization": "max_duration",
+            "inputs": ["x", "edge_index", "ptr"],
+            "torchscript": scripted,
+        }, f, indent=2)
+
+
+def load_module(directory: str) -> torch.nn.Module:
+    """
+    Recreates the exported network (as a regular PyTorch module) with its trained weights.
+    """
+    with open(os.path.join(directory, SCHEMA_FILE)) as f:
+        schema = json.load(f)
+    module = MODELS[schema["model"]](schema["num_features"])
+    module.load_state_dict(torch.load(os.path.join(directory, WEIGHTS_FILE),
+                                      map_location="cpu"))
+    return module.eval()
@@ -0,0 +1,68 @@
+import json
+import os
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+from torch_geometric.data import Data
+
+from .conversion import example_to_data
+from .data import TrainExample
+from .features import FeatureConfig
+
+# Bump when the layout of exported models changes
+EXPORT_VERSION = 1
+
+WEIGHTS_FILE = "weights.pt"
+SCHEMA_FILE = "schema.json"
+MODEL_FILE = "model.pt"
+
+
+def batch_tensors(samples: Sequence[Data]) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    Concatenates graphs into the (x, edge_index, ptr) inputs of an exported model.
+    """
+    counts = torch.tensor([data.num_nodes for data in samples], dtype=torch.long)
+    ptr = torch.cat((counts.new_zeros(1), torch.cumsum(counts, 0)))
+    x = torch.cat([data.x for data in samples])
+    edge_index = torch.cat([data.edge_index + ptr[i] for (i, data) in enumerate(samples)],
+                           dim=1)
+    return x, edge_index, ptr
+
+
+class ExportedModel:
+    """
+    Predicts makespans with a TorchScript model exported by `export_model`.
+    Only needs PyTorch and the feature extraction, so it loads quickly.
+    """
+
+    def __init__(self, directory: str, threads: Optional[int] = None, max_batch_size=256):
+        with open(os.path.join(directory, SCHEMA_FILE)) as f:
+            self.schema = json.load(f)
+        if self.schema["version"] != EXPORT_VERSION:
+            raise ValueError(f"Unsupported export version {self.schema['version']}")
+        if not self.schema["torchscript"]:
+            raise ValueError(f"Model {self.schema['model']} was exported without TorchScript")
+        self.config = FeatureConfig(tuple(self.schema["features"]["features"]))
+        self.module = torch.jit.load(os.path.join(directory, MODEL_FILE), map_location="cpu")
+        self.module.eval()
+        self.max_batch_size = max_batch_size
+        if threads is not None:
+            torch.set_num_threads(threads)
+
+    def predict(self, examples: Sequence[TrainExample]) -> np.ndarray:
+        predictions = []
+        for start in range(0, len(examples), self.max_batch_size):
+            predictions.append(self._predict_batch(examples[start:start + self.max_batch_size]))
+        if not predictions:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(predictions)
+
+    def _predict_batch(self, examples: Sequence[TrainExample]) -> np.ndarray:
+        samples = [example_to_data(example, 0, config=self.config) for example in examples]
+        (x, edge_index, ptr) = batch_tensors(samples)
+        max_durations = torch.tensor([data.normalization_factor for data in samples],
+                                     dtype=torch.float32)
+        with torch.inference_mode():
+            prediction = self.module(x, edge_index, ptr).squeeze(1)
+        return (prediction * max_durations).numpy()
@@ -0,0 +1,361 @@
+import dataclasses
+import hashlib
+import math
+from functools import cached_property
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+from estee.common import TaskGraph
+
+from .features import GraphStructure
+
+
+@dataclasses.dataclass(frozen=True)
+class Distribution:
+    """
+    Distribution of a task attribute.
+    `constant`: always `a`, `uniform`: [a, b), `normal`: mean `a` and deviation `b` (clipped
+    to positive values like `estee.generators.utils.normal`), `lognormal`: mean `a` and sigma
+    `b` of the underlying normal distribution, `exponential`: scale `a`.
+    """
+    kind: str = "constant"
+    a: float = 1.0
+    b: float = 0.0
+
+    def __post_init__(self):
+        if self.kind not in ("constant", "uniform", "normal", "lognormal", "exponential"):
+            raise ValueError(f"Unknown distribution {self.kind}")
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        if self.kind == "constant":
+            return np.full(size, self.a, dtype=np.float64)
+        if self.kind == "uniform":
+            return rng.uniform(self.a, self.b, size)
+        if self.kind == "normal":
+            return np.maximum(rng.normal(self.a, self.b, size), 0.0000001)
+        if self.kind == "lognormal":
+            return rng.lognormal(self.a, self.b, size)
+        return rng.exponential(self.a, size)
+
+
+def constant(value: float) -> Distribution:
+    return Distribution("constant", value)
+
+
+def normal(mean: float, deviation: float) -> Distribution:
+    return Distribution("normal", mean, deviation)
+
+
+@dataclasses.dataclass(frozen=True)
+class Role:
+    """
+    Attributes of a group of tasks with the same purpose in a graph (e.g. mappers).
+    Tasks without `output_size` have no outputs, so they have to be sinks.
+    `expected_duration` and `expected_size` (of the output) are the estimates that Estee
+    schedulers see, they stay unknown when not set.
+    """
+    duration: Distribution = constant(1)
+    output_size: Optional[Distribution] = constant(1)
+    cpus: int = 1
+    expected_duration: Optional[float] = None
+    expected_size: Optional[float] = None
+
+    def __post_init__(self):
+        if self.expected_size is not None and self.output_size is None:
+            raise ValueError("expected_size requires output_size")
+
+
+@dataclasses.dataclass()
+class GraphArrays:
+    """
+    Task graph stored as arrays indexed by task id.
+    `edges` is a (2, edge_count) array of unique (producer id, consumer id) pairs sorted by
+    producer (like `graph_to_arrays`) and tasks without outputs have NaN output size.
+    Unknown expected durations and sizes are NaN, they are all unknown when not passed.
+    """
+    durations: np.ndarray
+    cpus: np.ndarray
+    output_sizes: np.ndarray
+    edges: np.ndarray
+    expected_durations: Optional[np.ndarray] = None
+    expected_sizes: Optional[np.ndarray] = None
+
+    def __post_init__(self):
+        if self.expected_durations is None:
+            self.expected_durations = np.full(self.task_count, np.nan)
+        if self.expected_sizes is None:
+            self.expected_sizes = np.full(self.task_count, np.nan)
+
+    @property
+    def task_count(self) -> int:
+        return len(self.durations)
+
+    def structure(self) -> GraphStructure:
+        """
+        Returns the same structure as a conversion of `to_task_graph()` would.
+        """
+        # Tasks without outputs have zero (expected) output size in a task graph
+        no_outputs = np.isnan(self.output_sizes)
+        return GraphStructure(self.durations.astype(np.float32), self.edges,
+                              cpus=self.cpus.astype(np.float64),
+                              output_size=np.where(no_outputs, 0.0, self.output_sizes),
+                              expected_duration=self.expected_durations,
+                              expected_size=np.where(no_outputs, 0.0, self.expected_sizes))
+
+    def digest(self) -> str:
+        digest = hashlib.sha256()
+        for array in (self.durations, self.cpus, self.output_sizes, self.edges,
+                      self.expected_durations, self.expected_sizes):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    def to_task_graph(self) -> TaskGraph:
+        """
+        Builds an Estee task graph, task ids correspond to the array indices.
+        """
+        if np.isnan(self.output_sizes[self.edges[0]]).any():
+            raise ValueError("A task without outputs has consumers")
+        g = TaskGraph()
+        tasks = [g.new_task(duration=duration, expected_duration=_known(expected_duration),
+                            cpus=cpus, output_size=_known(output_size),
+                            expected_size=_known(expected_size))
+                 for (duration, expected_duration, cpus, output_size, expected_size)
+                 in zip(self.durations.tolist(), self.expected_durations.tolist(),
+                        self.cpus.tolist(), self.output_sizes.tolist(),
+                        self.expected_sizes.tolist())]
+        # Inputs are added in the order of producers for every consumer
+        order = np.lexsort(self.edges)
+        for (producer, consumer) in self.edges[:, order].T.tolist():
+            tasks[consumer].add_input(tasks[producer])
+        return g
+
+
+def _known(value: float) -> Optional[float]:
+    return None if math.isnan(value) else value
+
+
+@dataclasses.dataclass()
+class ArrayExample:
+    """
+    Training example generated directly as arrays, usable in place of `TrainExample`.
+    Features are computed from the arrays and the Estee task graph is only built when `graph`
+    is accessed, e.g. to simulate an example that is not in the simulation cache.
+    """
+    arrays: GraphArrays
+    worker_count: int
+    family: Optional[str] = None
+
+    @cached_property
+    def graph(self) -> TaskGraph:
+        return self.arrays.to_task_graph()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.pop("graph", None)
+        return state
+
+
+# (rng, approximate task count, family parameters) -> (role of every task, edges)
+Shape = Callable[..., Tuple[np.ndarray, np.ndarray]]
+
+
+def _edges(src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+    return np.stack((np.asarray(src, dtype=np.int64).ravel(),
+                     np.asarray(dst, dtype=np.int64).ravel()))
+
+
+def fork_join_shape(rng: np.random.Generator, size: int, width=8):
+    """
+    A chain of stages, each stage forks into `width` tasks that are joined by a single task.
+    Roles: 0 = root and join tasks, 1 = forked tasks.
+    """
+    stages = max(1, (size - 1) // (width + 1))
+    stage_starts = 1 + np.arange(stages) * (width + 1)
+    forks = stage_starts[:, None] + np.arange(width)
+    joins = stage_starts + width
+    previous = np.concatenate(([0], joins[:-1]))
+    edges = np.concatenate((_edges(np.repeat(previous, width), forks),
+                            _edges(forks, np.repeat(joins, width))), axis=1)
+    roles = np.zeros(1 + stages * (width + 1), dtype=np.int64)
+    roles[forks.ravel()] = 1
+    return roles, edges
+
+
+def mapreduce_shape(rng: np.random.Generator, size: int, reducers=8):
+    """
+    A split task feeding mappers, every mapper sends data to every reducer and a final task
+    merges the results of the reducers.
+    Roles: 0 = split and merge, 1 = mappers, 2 = reducers.
+    """
+    reducers = max(1, min(reducers, size // 2))
+    mappers = max(1, size - reducers - 2)
+    map_ids = 1 + np.arange(mappers)
+    reduce_ids = 1 + mappers + np.arange(reducers)
+    merge = 1 + mappers + reducers
+    edges = np.concatenate((_edges(np.zeros(mappers), map_ids),
+                            _edges(np.repeat(map_ids, reducers), np.tile(reduce_ids, mappers)),
+                            _edges(reduce_ids, np.full(reducers, merge))), axis=1)
+    roles = np.zeros(merge + 1, dtype=np.int64)
+    roles[map_ids] = 1
+    roles[reduce_ids] = 2
+    return roles, edges
+
+
+def stencil_shape(rng: np.random.Generator, size: int, width: Optional[int] = None, radius=1):
+    """
+    Iterative 1D stencil, task `i` of a step depends on tasks `i - radius..i + radius` of the
+    previous step. The width defaults to the square root of the size.
+    Roles: 0 = first step, 1 = other steps.
+    """
+    width = width or max(1, int(np.sqrt(size)))
+    steps = max(1, size // width)
+    ids = np.arange(width * steps).reshape(steps, width)
+    offsets = np.arange(-radius, radius + 1)
+    columns = np.arange(width)[:, None] + offsets
+    valid = (columns >= 0) & (columns < width)
+    neighbours = ids[:-1, :, None] + offsets
+    src = neighbours[:, valid]
+    dst = np.broadcast_to(ids[1:, :, None], neighbours.shape)[:, valid]
+    roles = np.ones(width * steps, dtype=np.int64)
+    roles[:width] = 0
+    return roles, _edges(src, dst)
+
+
+def layered_shape(rng: np.random.Generator, size: int, layers: Optional[int] = None, degree=2):
+    """
+    Random layered DAG, every task of a layer depends on up to `degree` random tasks of the
+    previous layer. The number of layers defaults to the square root of the size.
+    Roles: 0 = first layer, 1 = other layers.
+    """
+    layers = layers or max(1, int(np.sqrt(size)))
+    width = max(1, size // layers)
+    consumers = np.repeat(np.arange(width, width * layers), degree)
+    producers = (consumers // width - 1) * width + rng.integers(0, width, len(consumers))
+    keys = np.unique(producers * (width * layers) + consumers)
+    roles = np.ones(width * layers, dtype=np.int64)
+    roles[:width] = 0
+    return roles, _edges(keys // (width * layers), keys % (width * layers))
+
+
+def triplets_shape(rng: np.random.Generator, size: int):
+    """
+    Independent chains of three tasks. Roles: 0, 1, 2 = position in the chain.
+    """
+    count = max(1, size // 3)
+    ids = np.arange(count * 3).reshape(count, 3)
+    edges = np.concatenate((_edges(ids[:, 0], ids[:, 1]), _edges(ids[:, 1], ids[:, 2])), axis=1)
+    return np.tile(np.arange(3), count), edges
+
+
+def merge_neighbours_shape(rng: np.random.Generator, size: int):
+    """
+    A ring of tasks where each task of the second layer merges two neighbouring tasks of the
+    first layer. Roles: 0 = first layer, 1 = second layer.
+    """
+    count = max(2, size // 2)
+    first = np.arange(count)
+    second = count + first
+    edges = np.concatenate((_edges(first, second), _edges((first + 1) % count, second)), axis=1)
+    return np.repeat([0, 1], count), edges
+
+
+@dataclasses.dataclass(frozen=True)
+class GraphFamily:
+    """
+    Declarative description of a family of task graphs: the shape of the graph and the
+    distributions of task attributes of every role in it. Graphs are generated in bulk with
+    NumPy, so even graphs with hundreds of thousands of tasks are created quickly.
+    """
+    shape: Shape
+    roles: Tuple[Role, ...]
+
+    def arrays(self, size: int, rng: Optional[np.random.Generator] = None,
+               **params) -> GraphArrays:
+        """
+        Generates a graph with approximately `size` tasks, `params` are passed to the shape.
+        Without `rng`, a generator seeded from the global NumPy random state is used.
+        """
+        if rng is None:
+            rng = np.random.default_rng(np.random.randint(0, 2 ** 31))
+        (roles, edges) = self.shape(rng, size, **params)
+        edges = edges[:, np.lexsort((edges[1], edges[0]))]
+        task_count = len(roles)
+        durations = np.empty(task_count, dtype=np.float64)
+        cpus = np.empty(task_count, dtype=np.int64)
+        output_sizes = np.full(task_count, np.nan, dtype=np.float64)
+        expected_durations = np.full(task_count, np.nan, dtype=np.float64)
+        expected_sizes = np.full(task_count, np.nan, dtype=np.float64)
+        for (index, role) in enumerate(self.roles):
+            tasks = np.flatnonzero(roles == index)
+            durations[tasks] = role.duration.sample(rng, len(tasks))
+            cpus[tasks] = role.cpus
+            if role.output_size is not None:
+                output_sizes[tasks] = role.output_size.sample(rng, len(tasks))
+            if role.expected_duration is not None:
+                expected_durations[tasks] = role.expected_duration
+            if role.expected_size is not None:
+                expected_sizes[tasks] = role.expected_size
+        return GraphArrays(durations, cpus, output_sizes, edges, expected_durations,
+                           expected_sizes)
+
+    def generate(self, size: int, rng: Optional[np.random.Generator] = None,
+                 **params) -> TaskGraph:
+        return self.arrays(size, rng, **params).to_task_graph()
+
+
+FAMILIES: Dict[str, GraphFamily] = {
+    "fork-join": GraphFamily(fork_join_shape, (
+        Role(duration=normal(5, 1)),
+        Role(duration=normal(20, 5), output_size=normal(50, 10)),
+    )),
+    # Expected values are the means of the distributions, like in Estee's generators
+    "mapreduce": GraphFamily(mapreduce_shape, (
+        Role(duration=normal(5, 1), output_size=constant(100), expected_duration=5,
+             expected_size=100),
+        Role(duration=normal(30, 8), output_size=normal(20, 5), expected_duration=30,
+             expected_size=20),
+        Role(duration=normal(15, 4), output_size=normal(10, 2), expected_duration=15,
+             expected_size=10),
+    )),
+    "stencil": GraphFamily(stencil_shape, (
+        Role(duration=normal(10, 2), output_size=constant(10)),
+        Role(duration=normal(10, 2), output_size=constant(10)),
+    )),
+    "layered": GraphFamily(layered_shape, (
+        Role(duration=Distribution("lognormal", 2, 0.5),
+             output_size=Distribution("exponential", 20)),
+        Role(duration=Distribution("lognormal", 2, 0.5),
+             output_size=Distribution("exponential", 20)),
+    )),
+    # The same distributions as `triplets` and `merge_neighbours` in `generator.py`
+    "triplets": GraphFamily(triplets_shape, (
+        Role(duration=normal(5, 1.5), output_size=constant(40), expected_duration=5),
+        Role(duration=normal(120, 20), output_size=constant(120), expected_duration=120),
+        Role(duration=normal(32, 3), output_size=None, expected_duration=32),
+    )),
+    "merge_neighbours": GraphFamily(merge_neighbours_shape, (
+        Role(duration=normal(24, 5), output_size=normal(99, 2.5), expected_duration=15,
+             expected_size=100),
+        Role(duration=normal(20, 5), output_size=None, expected_duration=15),
+    )),
+}
+
+
+def generate_arrays(family: str, size: int, rng: Optional[np.random.Generator] = None,
+                    **params) -> GraphArrays:
+    if family not in FAMILIES:
+        raise ValueError(f"Unknown graph family {family}, available: {list(FAMILIES)}")
+    return FAMILIES[family].arrays(size, rng, **params)
+
+
+def generate_example(family: str, size: int, worker_count: int,
+                     rng: Optional[np.random.Generator] = None, **params) -> ArrayExample:
+    return ArrayExample(generate_arrays(family, size, rng, **params), worker_count, family)
+
+
+def generate_graph(family: str, size: int, rng: Optional[np.random.Generator] = None,
+                   **params) -> TaskGraph:
+    """
+    Generates a task graph of the given family with approximately `size` tasks.
+    """
+    return generate_arrays(family, size, rng, **params).to_task_graph()
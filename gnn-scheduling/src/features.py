@@ -0,0 +1,246 @@
+import dataclasses
+import math
+from functools import cached_property
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+from estee.common import TaskGraph
+
+
+class GraphStructure:
+    """
+    Array view of a task graph that computes structural properties on demand.
+    `edges` is a (2, edge_count) array of (producer id, consumer id) pairs.
+    Task cpus, output sizes and expected durations and output sizes are read from `graph`,
+    unless they are passed as arrays. Unknown expected values are NaN.
+    """
+
+    def __init__(self, durations: np.ndarray, edges: np.ndarray, graph: TaskGraph = None,
+                 cpus: np.ndarray = None, output_size: np.ndarray = None,
+                 expected_duration: np.ndarray = None, expected_size: np.ndarray = None):
+        self.durations = durations
+        self.edges = edges
+        self.graph = graph
+        if cpus is not None:
+            self.cpus = cpus
+        if output_size is not None:
+            self.output_size = output_size
+        if expected_duration is not None:
+            self.expected_duration = expected_duration
+        if expected_size is not None:
+            self.expected_size = expected_size
+
+    @property
+    def task_count(self) -> int:
+        return len(self.durations)
+
+    @cached_property
+    def in_degree(self) -> np.ndarray:
+        return np.bincount(self.edges[1], minlength=self.task_count)
+
+    @cached_property
+    def out_degree(self) -> np.ndarray:
+        return np.bincount(self.edges[0], minlength=self.task_count)
+
+    @cached_property
+    def levels(self) -> np.ndarray:
+        """
+        Length (in edges) of the longest path from a source task to each task.
+        """
+        return topological_levels(self.task_count, self.edges)
+
+    @cached_property
+    def _level_edges(self) -> Tuple[np.ndarray, np.ndarray]:
+        # Edges sorted by the level of their producer, with boundaries of each level
+        edge_levels = self.levels[self.edges[0]]
+        order = np.argsort(edge_levels, kind="stable")
+        level_count = int(self.levels.max()) + 1 if self.task_count else 0
+        bounds = np.searchsorted(edge_levels[order], np.arange(level_count + 1))
+        return self.edges[:, order], bounds
+
+    @cached_property
+    def t_level(self) -> np.ndarray:
+        """
+        Length of the longest path from a source task to the start of each task.
+        """
+        (edges, bounds) = self._level_edges
+        t_level = np.zeros(self.task_count, dtype=np.float64)
+        for level in range(len(bounds) - 1):
+            (src, dst) = edges[:, bounds[level]:bounds[level + 1]]
+            np.maximum.at(t_level, dst, t_level[src] + self.durations[src])
+        return t_level
+
+    @cached_property
+    def b_level(self) -> np.ndarray:
+        """
+        Length of the longest path from the start of each task to the end of a leaf task.
+        """
+        (edges, bounds) = self._level_edges
+        b_level = self.durations.astype(np.float64)
+        for level in reversed(range(len(bounds) - 1)):
+            (src, dst) = edges[:, bounds[level]:bounds[level + 1]]
+            np.maximum.at(b_level, src, self.durations[src] + b_level[dst])
+        return b_level
+
+    @cached_property
+    def critical_path_length(self) -> float:
+        return float(self.b_level.max()) if self.task_count else 0.0
+
+    @cached_property
+    def critical_path(self) -> np.ndarray:
+        return np.isclose(self.t_level + self.b_level, self.critical_path_length)
+
+    @cached_property
+    def total_work(self) -> float:
+        return float(np.dot(self.durations, self.cpus))
+
+    def work_bound(self, worker_count: int, cpus_per_worker=1) -> float:
+        """
+        Total work spread perfectly over all worker cpus.
+        """
+        return self.total_work / (worker_count * cpus_per_worker)
+
+    def lower_bound(self, worker_count: int, cpus_per_worker=1) -> float:
+        return max(self.critical_path_length, self.work_bound(worker_count, cpus_per_worker))
+
+    def upper_bound(self, worker_count: int, cpus_per_worker=1) -> float:
+        """
+        Graham's bound for list scheduling of single-cpu tasks without transfer costs:
+        `work / m + (1 - 1 / m) * critical path`. Tasks using more cpus fall back to
+        executing the tasks one after another.
+        """
+        if self.task_count and self.cpus.max() > 1:
+            return float(self.durations.sum())
+        cpus = worker_count * cpus_per_worker
+        return self.total_work / cpus + (1 - 1 / cpus) * self.critical_path_length
+
+    @cached_property
+    def cpus(self) -> np.ndarray:
+        return self._task_values(lambda t: t.cpus)
+
+    @cached_property
+    def output_size(self) -> np.ndarray:
+        return self._task_values(lambda t: sum(o.size for o in t.outputs))
+
+    @cached_property
+    def expected_duration(self) -> np.ndarray:
+        return self._task_values(lambda t: _known(t.expected_duration))
+
+    @cached_property
+    def expected_size(self) -> np.ndarray:
+        return self._task_values(lambda t: sum(_known(o.expected_size) for o in t.outputs))
+
+    def _task_values(self, fn: Callable) -> np.ndarray:
+        tasks = self.graph.tasks.values()
+        values = np.empty(self.task_count, dtype=np.float64)
+        values[np.fromiter((t.id for t in tasks), dtype=np.int64, count=self.task_count)] = \
+            np.fromiter((fn(t) for t in tasks), dtype=np.float64, count=self.task_count)
+        return values
+
+
+def _known(value) -> float:
+    return math.nan if value is None else value
+
+
+def topological_levels(task_count: int, edges: np.ndarray) -> np.ndarray:
+    """
+    Assigns each task the length of the longest path from a source task, processing a whole
+    frontier of ready tasks at once.
+    """
+    order = np.argsort(edges[0], kind="stable")
+    targets = edges[1, order]
+    row_ptr = np.searchsorted(edges[0, order], np.arange(task_count + 1))
+
+    in_degree = np.bincount(edges[1], minlength=task_count)
+    levels = np.zeros(task_count, dtype=np.int64)
+    frontier = np.flatnonzero(in_degree == 0)
+    processed = 0
+    level = 0
+    while frontier.size:
+        levels[frontier] = level
+        processed += frontier.size
+
+        starts = row_ptr[frontier]
+        counts = row_ptr[frontier + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        consumers = targets[offsets + np.arange(offsets.size)]
+        # Only touch the consumers, so that each edge is processed once in total
+        np.subtract.at(in_degree, consumers, 1)
+        consumers = np.unique(consumers)
+        frontier = consumers[in_degree[consumers] == 0]
+        level += 1
+
+    if processed != task_count:
+        raise ValueError("Task graph contains a cycle")
+    return levels
+
+
+@dataclasses.dataclass(frozen=True)
+class Feature:
+    compute: Callable[[GraphStructure, int], np.ndarray]
+    # "duration": divided by the longest task duration, "max": divided by its maximum in the
+    # graph, None: left as is
+    normalization: str = None
+
+
+FEATURES: Dict[str, Feature] = {
+    "duration": Feature(lambda g, w: g.durations, normalization="duration"),
+    # The original features divided the worker count by the longest duration as well
+    "worker_count": Feature(lambda g, w: np.full(g.task_count, w), normalization="duration"),
+    "cpus": Feature(lambda g, w: g.cpus),
+    "output_size": Feature(lambda g, w: g.output_size, normalization="max"),
+    "in_degree": Feature(lambda g, w: g.in_degree),
+    "out_degree": Feature(lambda g, w: g.out_degree),
+    "t_level": Feature(lambda g, w: g.t_level, normalization="duration"),
+    "b_level": Feature(lambda g, w: g.b_level, normalization="duration"),
+    "critical_path": Feature(lambda g, w: g.critical_path),
+    "lower_bound": Feature(lambda g, w: np.full(g.task_count, g.lower_bound(w)),
+                           normalization="duration"),
+    "upper_bound": Feature(lambda g, w: np.full(g.task_count, g.upper_bound(w)),
+                           normalization="duration"),
+}
+
+
+@dataclasses.dataclass(frozen=True)
+class FeatureConfig:
+    features: Tuple[str, ...] = ("duration", "worker_count")
+
+    def __post_init__(self):
+        unknown = [f for f in self.features if f not in FEATURES]
+        if unknown:
+            raise ValueError(f"Unknown features {unknown}, available: {list(FEATURES)}")
+
+    @property
+    def num_features(self) -> int:
+        return len(self.features)
+
+    def to_dict(self):
+        return {"features": list(self.features), "normalization": "max_duration"}
+
+
+DEFAULT_FEATURES = FeatureConfig()
+STRUCTURAL_FEATURES = FeatureConfig(tuple(FEATURES))
+
+
+def extract_features(structure: GraphStructure, worker_count: int, config: FeatureConfig,
+                     out: np.ndarray = None) -> np.ndarray:
+    """
+    Returns a (task_count, num_features) matrix of raw (unnormalized) node features.
+    """
+    if out is None:
+        out = np.empty((structure.task_count, config.num_features), dtype=np.float32)
+    for (column, name) in enumerate(config.features):
+        out[:, column] = FEATURES[name].compute(structure, worker_count)
+    return out
+
+
+def normalize_features(features: np.ndarray, config: FeatureConfig, max_duration: float):
+    for (column, name) in enumerate(config.features):
+        normalization = FEATURES[name].normalization
+        if normalization == "duration":
+            features[:, column] /= max_duration
+        elif normalization == "max" and features.shape[0]:
+            maximum = features[:, column].max()
+            if maximum > 0:
+                features[:, column] /= maximum
+    return features
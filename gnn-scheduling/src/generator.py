@@ -1,10 +1,16 @@
+import dataclasses
+from typing import Optional
+
 from estee.common import DataObject, TaskGraph
 from estee.generators.utils import normal
-from estee.schedulers import BlevelGtScheduler
+from estee.schedulers import (BlevelGtScheduler, DLSScheduler, ETFScheduler, MCPScheduler,
+                              RandomScheduler, TlevelGtScheduler, WorkStealingScheduler)
 from estee.simulator import Simulator, Worker
-from estee.simulator.netmodels import InstantNetModel
+from estee.simulator.netmodels import InstantNetModel, MaxMinFlowNetModel, SimpleNetModel
 
 from .data import TrainExample
+from .hashing import example_hash
+from .simcache import SimulationCache
 
 
 def merge_neighbours(count, normal_center=20):
@@ -35,11 +41,66 @@ def triplets(count, cpus):
     return g
 
 
-def simulate_graph(example: TrainExample):
-    netmodel = InstantNetModel()
+SCHEDULERS = {
+    "blevel-gt": BlevelGtScheduler,
+    "tlevel-gt": TlevelGtScheduler,
+    "dls": DLSScheduler,
+    "etf": ETFScheduler,
+    "mcp": MCPScheduler,
+    "random": RandomScheduler,
+    "ws": WorkStealingScheduler,
+}
+
+NETMODELS = {
+    "instant": lambda bandwidth: InstantNetModel(),
+    "simple": lambda bandwidth: SimpleNetModel(bandwidth),
+    "maxmin": lambda bandwidth: MaxMinFlowNetModel(bandwidth),
+}
+
+
+@dataclasses.dataclass(frozen=True)
+class SimulationConfig:
+    scheduler: str = "blevel-gt"
+    cpus: int = 1
+    netmodel: str = "instant"
+    # Only used by netmodels that simulate transfers
+    bandwidth: Optional[float] = None
+
+    def __post_init__(self):
+        if self.scheduler not in SCHEDULERS:
+            raise ValueError(f"Unknown scheduler {self.scheduler}, available: {list(SCHEDULERS)}")
+        if self.netmodel not in NETMODELS:
+            raise ValueError(f"Unknown netmodel {self.netmodel}, available: {list(NETMODELS)}")
+        if self.netmodel != "instant" and self.bandwidth is None:
+            raise ValueError(f"Netmodel {self.netmodel} needs a bandwidth")
+
+    @property
+    def netmodel_id(self) -> str:
+        if self.netmodel == "instant":
+            return self.netmodel
+        return f"{self.netmodel}-{self.bandwidth}"
+
+
+DEFAULT_SIMULATION = SimulationConfig()
+
+
+def simulate_graph(example: TrainExample, cache: Optional[SimulationCache] = None,
+                   config: SimulationConfig = DEFAULT_SIMULATION):
+    if cache is not None:
+        key = SimulationCache.key(example_hash(example), example.worker_count,
+                                  cpus=config.cpus, netmodel=config.netmodel_id,
+                                  scheduler=config.scheduler)
+        makespan = cache.get(key)
+        if makespan is not None:
+            return makespan
+
+    netmodel = NETMODELS[config.netmodel](config.bandwidth)
 
-    scheduler = BlevelGtScheduler()
-    workers = [Worker(cpus=1) for _ in range(example.worker_count)]
+    scheduler = SCHEDULERS[config.scheduler]()
+    workers = [Worker(cpus=config.cpus) for _ in range(example.worker_count)]
     simulator = Simulator(example.graph, workers, scheduler, netmodel)
 
-    return simulator.run()
+    makespan = simulator.run()
+    if cache is not None:
+        cache.put(key, makespan)
+    return makespan
@@ -0,0 +1,126 @@
+import hashlib
+from typing import Iterable, Iterator, List, Tuple
+
+import numpy as np
+from estee.common import TaskGraph
+
+from .conversion import example_structure, graph_to_arrays
+from .data import TrainExample
+from .features import GraphStructure
+
+_UP = np.uint64(0x9e3779b97f4a7c15)
+_DOWN = np.uint64(0xc2b2ae3d27d4eb4f)
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    # splitmix64 finalizer, the arithmetic wraps around on uint64 arrays
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xbf58476d1ce4e5b9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94d049bb133111eb)
+    return x ^ (x >> np.uint64(31))
+
+
+def _propagate(labels: np.ndarray, levels: np.ndarray, edges: np.ndarray, salt: np.uint64,
+               reverse: bool) -> np.ndarray:
+    """
+    Combines the label of every task with the multiset of already combined labels of its
+    predecessors (or successors with `reverse`), processing tasks level by level.
+    """
+    (src, dst) = (edges[1], edges[0]) if reverse else (edges[0], edges[1])
+    # Group edges by the level of the task that receives the labels, and by the receiving task
+    # within a level
+    edge_levels = levels[dst]
+    order = np.lexsort((dst, edge_levels))
+    (src, dst) = (src[order], dst[order])
+    level_count = int(levels.max()) + 1
+    bounds = np.searchsorted(edge_levels[order], np.arange(level_count + 1))
+
+    result = _mix(labels)
+    for level in (reversed(range(level_count)) if reverse else range(level_count)):
+        (start, end) = (bounds[level], bounds[level + 1])
+        if start == end:
+            continue
+        receivers = dst[start:end]
+        groups = np.flatnonzero(np.concatenate(([True], receivers[1:] != receivers[:-1])))
+        received = np.add.reduceat(_mix(result[src[start:end]] + salt), groups)
+        targets = receivers[groups]
+        result[targets] = _mix(labels[targets] ^ received)
+    return result
+
+
+def _node_labels(structure: GraphStructure, weighted: bool) -> np.ndarray:
+    if not weighted:
+        return np.zeros(structure.task_count, dtype=np.uint64)
+    labels = np.zeros(structure.task_count, dtype=np.uint64)
+    for values in (structure.durations, structure.cpus, structure.output_size,
+                   structure.expected_duration, structure.expected_size):
+        # Unknown expected values are NaN, whose bits are not unique
+        values = np.nan_to_num(values.astype(np.float64), nan=-1.0)
+        labels = _mix(labels ^ values.view(np.uint64))
+    return labels
+
+
+def structure_graph_hash(structure: GraphStructure, weighted: bool) -> str:
+    """
+    Hashes a task graph independently of task ids and names.
+
+    Every task gets a label that combines everything above it (in topological order) and
+    everything below it, and the graph hash is computed from the sorted multiset of these
+    labels. Each edge is processed once in each direction, so the hash runs in O(V + E) plus
+    sorting. Isomorphic graphs always have the same hash. With `weighted`, task durations,
+    cpus, output sizes and the expected durations and output sizes are part of the hash.
+    """
+    if structure.task_count == 0:
+        return hashlib.sha256(b"empty").hexdigest()
+    labels = _node_labels(structure, weighted)
+    levels = structure.levels
+    up = _propagate(labels, levels, structure.edges, _UP, reverse=False)
+    down = _propagate(labels, levels, structure.edges, _DOWN, reverse=True)
+    final = np.sort(_mix(up ^ _mix(down + _DOWN)))
+
+    digest = hashlib.sha256()
+    digest.update(np.array([structure.task_count, structure.edges.shape[1], weighted],
+                           dtype=np.int64).tobytes())
+    digest.update(final.tobytes())
+    return digest.hexdigest()
+
+
+def graph_hash(graph: TaskGraph, weighted=True) -> str:
+    (durations, edges) = graph_to_arrays(graph)
+    return structure_graph_hash(GraphStructure(durations, edges, graph), weighted)
+
+
+def structure_hash(graph: TaskGraph) -> str:
+    """
+    Hash of the graph shape only, graphs generated with the same parameters often share it.
+    """
+    return graph_hash(graph, weighted=False)
+
+
+def weighted_hash(graph: TaskGraph) -> str:
+    return graph_hash(graph, weighted=True)
+
+
+def example_hash(example: TrainExample, weighted=True) -> str:
+    """
+    Hash of the graph of an example, does not build a task graph for an `ArrayExample`.
+    """
+    return structure_graph_hash(example_structure(example), weighted)
+
+
+def dedupe_rows(rows: Iterable[Tuple[TrainExample, float]],
+                weighted=True) -> Iterator[Tuple[TrainExample, float]]:
+    """
+    Lazily drops rows whose graph (and worker count) was already seen.
+    """
+    seen = set()
+    for (example, makespan) in rows:
+        key = (example_hash(example, weighted), example.worker_count)
+        if key not in seen:
+            seen.add(key)
+            yield example, makespan
+
+
+def dedupe_examples(examples: Iterable[TrainExample], weighted=True) -> List[TrainExample]:
+    return [example for (example, _) in dedupe_rows(((e, None) for e in examples), weighted)]
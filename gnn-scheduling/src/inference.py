@@ -0,0 +1,221 @@
+import argparse
+import os
+import queue
+import secrets
+import sys
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener
+from typing import TYPE_CHECKING, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import torch
+from torch_geometric.data import Batch
+
+from .conversion import example_to_data
+from .data import TrainExample
+from .exported import ExportedModel
+from .features import FeatureConfig
+from .precision import PRECISIONS, reduce_precision
+
+if TYPE_CHECKING:
+    # Importing the model loads PyTorch Lightning, which is slow and not needed to serve an
+    # exported model
+    from .model import MakespanPredictor
+
+Address = Tuple[str, int]
+
+# Environment variable with the key shared by the inference server and its clients
+AUTHKEY_ENV = "MAKESPAN_AUTHKEY"
+
+
+def _authkey(authkey: Optional[bytes]) -> bytes:
+    """
+    Returns `authkey`, or the key from `AUTHKEY_ENV` if it is not given.
+    Requests are unpickled, so connections have to be authenticated.
+    """
+    if not authkey:
+        authkey = os.environ.get(AUTHKEY_ENV, "").encode()
+    if not authkey:
+        raise ValueError(f"An authkey is required, pass it explicitly or set {AUTHKEY_ENV}")
+    return authkey
+
+
+class MakespanInference:
+    """
+    Predicts denormalized makespans of task graphs with a trained model on the CPU.
+    `precision` selects a reduced precision mode from `PRECISIONS` (e.g. int8 heads).
+    The network is copied, so the passed model is not modified.
+    """
+
+    def __init__(self, model: "MakespanPredictor", config: FeatureConfig,
+                 threads: Optional[int] = None, max_batch_size=256, precision="fp32"):
+        # A CPU copy of the network in evaluation mode
+        self.module = reduce_precision(model.module, precision)
+        self.denormalizer = model.denormalizer
+        self.config = config
+        self.max_batch_size = max_batch_size
+        if threads is not None:
+            torch.set_num_threads(threads)
+
+    @staticmethod
+    def from_checkpoint(path: str, threads: Optional[int] = None, max_batch_size=256,
+                        precision="fp32") -> "MakespanInference":
+        from .model import MakespanPredictor
+
+        model = MakespanPredictor.load_from_checkpoint(path, map_location="cpu")
+        config = FeatureConfig(tuple(model.hparams.features))
+        return MakespanInference(model, config, threads=threads, max_batch_size=max_batch_size,
+                                 precision=precision)
+
+    def predict(self, examples: Sequence[TrainExample]) -> np.ndarray:
+        predictions = []
+        for start in range(0, len(examples), self.max_batch_size):
+            predictions.append(self._predict_batch(examples[start:start + self.max_batch_size]))
+        if not predictions:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(predictions)
+
+    def _predict_batch(self, examples: Sequence[TrainExample]) -> np.ndarray:
+        batch = Batch.from_data_list([example_to_data(example, 0, config=self.config)
+                                      for example in examples])
+        with torch.inference_mode():
+            prediction = self.module(batch)
+            prediction = self.denormalizer.denormalize(prediction, batch)
+        return prediction.squeeze(1).numpy()
+
+
+class _Request:
+    def __init__(self, examples: List[TrainExample]):
+        self.examples = examples
+        self.result = None
+        self.done = threading.Event()
+
+
+class InferenceServer:
+    """
+    Serves predictions to local clients (see `InferenceClient`).
+
+    Requests from all connections are collected into micro-batches of up to `max_batch_size`
+    graphs. A batch is evaluated as soon as it is full or when no new request arrives within
+    `max_delay` seconds.
+    Clients have to know `authkey` (by default read from `AUTHKEY_ENV`).
+    """
+
+    def __init__(self, inference: Union[MakespanInference, ExportedModel],
+                 address: Address = ("localhost", 5555), authkey: Optional[bytes] = None,
+                 max_batch_size=64, max_delay=0.002):
+        self.inference = inference
+        self.address = address
+        self.authkey = _authkey(authkey)
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.requests = queue.Queue()
+
+    def serve_forever(self):
+        threading.Thread(target=self._batch_loop, daemon=True).start()
+        with Listener(self.address, authkey=self.authkey) as listener:
+            while True:
+                try:
+                    connection = listener.accept()
+                except AuthenticationError:
+                    # A client with a wrong key must not stop the server
+                    continue
+                threading.Thread(target=self._handle_connection, args=(connection,),
+                                 daemon=True).start()
+
+    def _handle_connection(self, connection: Connection):
+        with connection:
+            while True:
+                try:
+                    examples = connection.recv()
+                except EOFError:
+                    return
+                request = _Request(examples)
+                self.requests.put(request)
+                request.done.wait()
+                connection.send(request.result)
+
+    def _batch_loop(self):
+        while True:
+            requests = [self.requests.get()]
+            size = len(requests[0].examples)
+            while size < self.max_batch_size:
+                try:
+                    request = self.requests.get(timeout=self.max_delay)
+                except queue.Empty:
+                    break
+                requests.append(request)
+                size += len(request.examples)
+            self._evaluate(requests)
+
+    def _evaluate(self, requests: List[_Request]):
+        examples = [example for request in requests for example in request.examples]
+        try:
+            predictions = self.inference.predict(examples)
+        except Exception as e:
+            for request in requests:
+                request.result = e
+                request.done.set()
+            return
+
+        start = 0
+        for request in requests:
+            end = start + len(request.examples)
+            request.result = predictions[start:end]
+            request.done.set()
+            start = end
+
+
+class InferenceClient:
+    def __init__(self, address: Address = ("localhost", 5555), authkey: Optional[bytes] = None):
+        self.connection = Client(address, authkey=_authkey(authkey))
+
+    def predict(self, examples: Sequence[TrainExample]) -> np.ndarray:
+        self.connection.send(list(examples))
+        result = self.connection.recv()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve makespan predictions")
+    parser.add_argument("model", help="Lightning checkpoint or a directory with an exported model")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=5555)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-delay", type=float, default=0.002)
+    parser.add_argument("--precision", default="fp32", choices=list(PRECISIONS),
+                        help="Reduced precision mode of a checkpoint model")
+    parser.add_argument("--authkey", help=f"Key shared with the clients, defaults to "
+                                          f"${AUTHKEY_ENV} or a newly generated key")
+    parser.add_argument("--authkey-file", help="Read the shared key from a file")
+    args = parser.parse_args()
+
+    authkey = args.authkey or os.environ.get(AUTHKEY_ENV)
+    if args.authkey_file:
+        with open(args.authkey_file) as f:
+            authkey = f.read().strip()
+    if not authkey:
+        authkey = secrets.token_hex(16)
+        print(f"Generated authkey: {authkey}", file=sys.stderr)
+
+    if os.path.isdir(args.model):
+        inference = ExportedModel(args.model, threads=args.threads)
+    else:
+        inference = MakespanInference.from_checkpoint(args.model, threads=args.threads,
+                                                      precision=args.precision)
+    server = InferenceServer(inference, (args.host, args.port), authkey=authkey.encode(),
+                             max_batch_size=args.max_batch_size, max_delay=args.max_delay)
+    server.serve_forever()
@@ -0,0 +1,193 @@
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+
+class Phase:
+    def __init__(self, name: str, parent: Optional["Phase"] = None):
+        self.name = name
+        self.parent = parent
+        self.start = time.perf_counter()
+        self.end = None
+        self.children: List[Phase] = []
+        self.counters: Dict[str, float] = {}
+        self.profile: Optional[str] = None
+        self.peak_memory: Optional[int] = None
+
+    @property
+    def duration(self) -> float:
+        end = time.perf_counter() if self.end is None else self.end
+        return end - self.start
+
+    @property
+    def path(self) -> str:
+        if self.parent is None or self.parent.parent is None:
+            return self.name
+        return f"{self.parent.path}/{self.name}"
+
+    def rates(self) -> Dict[str, float]:
+        duration = self.duration
+        if duration <= 0:
+            return {}
+        return {f"{name}/s": value / duration for (name, value) in self.counters.items()}
+
+    def to_dict(self, origin: float) -> dict:
+        data = {
+            "name": self.name,
+            "start_s": self.start - origin,
+            "duration_s": self.duration,
+            "counters": self.counters,
+            "rates": self.rates(),
+            "children": [child.to_dict(origin) for child in self.children]
+        }
+        if self.profile is not None:
+            data["profile"] = self.profile
+        if self.peak_memory is not None:
+            data["peak_memory_bytes"] = self.peak_memory
+        return data
+
+
+class Instrumentation:
+    """
+    Records a tree of nested, timed phases with counters.
+
+    ```
+    with instrumentation.phase("convert"):
+        ...
+        instrumentation.count("graphs", len(dataset))
+    ```
+    Phases are measured with a monotonic clock. A phase can optionally capture a `cProfile`
+    profile and the peak memory allocated by Python (using `tracemalloc`).
+    """
+
+    def __init__(self, verbose=False):
+        self.root = Phase("root")
+        self.stack = [self.root]
+        self.verbose = verbose
+
+    @property
+    def current(self) -> Phase:
+        return self.stack[-1]
+
+    @contextlib.contextmanager
+    def phase(self, name: str, profile=False, trace_memory=False):
+        phase = Phase(name, self.current)
+        self.current.children.append(phase)
+        self.stack.append(phase)
+
+        profiler = None
+        if profile:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        started_tracing = trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        elif trace_memory:
+            tracemalloc.reset_peak()
+        phase.start = time.perf_counter()
+
+        try:
+            yield phase
+        finally:
+            phase.end = time.perf_counter()
+            if trace_memory:
+                phase.peak_memory = tracemalloc.get_traced_memory()[1]
+                if started_tracing:
+                    tracemalloc.stop()
+            if profiler is not None:
+                profiler.disable()
+                output = io.StringIO()
+                pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(30)
+                phase.profile = output.getvalue()
+            self.stack.pop()
+            if self.verbose:
+                print(f"{phase.path}: {phase.duration * 1000:.3f} ms")
+
+    def count(self, name: str, value: float = 1):
+        counters = self.current.counters
+        counters[name] = counters.get(name, 0) + value
+
+    def phases(self) -> List[Phase]:
+        phases = []
+        stack = list(reversed(self.root.children))
+        while stack:
+            phase = stack.pop()
+            phases.append(phase)
+            stack.extend(reversed(phase.children))
+        return phases
+
+    def summary(self) -> Dict[str, dict]:
+        """
+        Aggregates phases with the same path (e.g. repeated phases inside a loop).
+        """
+        summary = {}
+        for phase in self.phases():
+            entry = summary.setdefault(phase.path, {"calls": 0, "duration_s": 0.0,
+                                                    "counters": {}})
+            entry["calls"] += 1
+            entry["duration_s"] += phase.duration
+            for (name, value) in phase.counters.items():
+                entry["counters"][name] = entry["counters"].get(name, 0) + value
+        for entry in summary.values():
+            if entry["duration_s"] > 0:
+                entry["rates"] = {f"{name}/s": value / entry["duration_s"]
+                                  for (name, value) in entry["counters"].items()}
+        return summary
+
+    def to_dict(self) -> dict:
+        origin = self.root.start
+        return {
+            "phases": [phase.to_dict(origin) for phase in self.root.children],
+            "summary": self.summary()
+        }
+
+    def to_json(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def to_chrome_trace(self, path: str):
+        """
+        Writes the phases in the Chrome trace event format (chrome://tracing, Perfetto).
+        """
+        origin = self.root.start
+        events = []
+        for phase in self.phases():
+            events.append({
+                "name": phase.name,
+                "ph": "X",
+                "ts": (phase.start - origin) * 1e6,
+                "dur": phase.duration * 1e6,
+                "pid": os.getpid(),
+                "tid": 0,
+                "args": dict(phase.counters, **phase.rates())
+            })
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def report(self) -> str:
+        lines = []
+        for phase in self.phases():
+            depth = phase.path.count("/")
+            counters = ", ".join(f"{name}={value:.1f}"
+                                 for (name, value) in dict(phase.counters,
+                                                           **phase.rates()).items())
+            lines.append(f"{'  ' * depth}{phase.name}: {phase.duration * 1000:.3f} ms"
+                         f"{f' ({counters})' if counters else ''}")
+        return "\n".join(lines)
+
+
+INSTRUMENTATION = Instrumentation()
+
+
+def phase(name: str, profile=False, trace_memory=False):
+    return INSTRUMENTATION.phase(name, profile=profile, trace_memory=trace_memory)
+
+
+def count(name: str, value: float = 1):
+    INSTRUMENTATION.count(name, value)
@@ -0,0 +1,439 @@
+import dataclasses
+import inspect
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import pytorch_lightning as pl
+import torch
+import torch.nn.functional as F
+from torch_geometric.data import Data
+from torch_geometric.nn import (GATConv, GCNConv, GINConv, global_add_pool, global_max_pool,
+                                global_mean_pool)
+from torch_geometric.nn.conv.gcn_conv import gcn_norm
+from torch_scatter import scatter, segment_csr
+from torch_sparse import SparseTensor, matmul
+from torchmetrics import MeanAbsoluteError
+
+from .features import DEFAULT_FEATURES, topological_levels
+
+
+class Denormalizer:
+    def denormalize(self, value, batch):
+        return value * batch.normalization_factor.unsqueeze(1)
+
+
+class GCN(torch.nn.Module):
+    def __init__(self, num_features: int):
+        super().__init__()
+        self.conv1 = GCNConv(num_features, 32, flow="target_to_source")
+        self.conv2 = GCNConv(num_features, 32, flow="source_to_target")
+        self.conv3 = GCNConv(64, 64)
+        self.node_head1 = torch.nn.Linear(64, 32)
+        self.graph_head = torch.nn.Linear(96, 1)
+
+    def forward(self, data):
+        x, edge_index = data.x, data.edge_index
+
+        input = x
+
+        x1 = self.conv1(input, edge_index)
+        x2 = self.conv2(input, edge_index)
+
+        x = torch.cat([x1, x2], axis=-1)
+        x = F.relu(x)
+
+        x = self.conv3(x, edge_index)
+        x = F.relu(x)
+
+        x = self.node_head1(x)
+        x = F.relu(x)
+
+        sum = global_add_pool(x, data.batch)
+        mean = global_mean_pool(x, data.batch)
+        max = global_max_pool(x, data.batch)
+
+        x = torch.cat([sum, mean, max], axis=1)
+        x = self.graph_head(x)
+        return x
+
+
+# Older PyG versions (e.g. 2.0.1) normalize `GCNConv` by in-degrees even with the
+# "target_to_source" flow, newer ones by the degrees in the direction of the flow
+GCN_NORM_FLOW = "flow" in inspect.signature(gcn_norm).parameters
+
+
+def normalized_edges(edge_index: torch.Tensor, num_nodes: int,
+                     flow: str) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Returns the edges (with self loops) and edge weights that `GCNConv` with the default
+    options and the given `flow` uses in the installed PyG version.
+    """
+    if GCN_NORM_FLOW:
+        return gcn_norm(edge_index, None, num_nodes, False, True, flow)
+    return gcn_norm(edge_index, None, num_nodes, False, True)
+
+
+def gcn_adjacency(edge_index: torch.Tensor, num_nodes: int) -> Tuple[torch.Tensor, ...]:
+    """
+    Computes the normalized adjacency (with self loops) of `GCNConv` in both flow directions.
+
+    Returns (row, direction, col, weight) entries, where direction 0 is the
+    "target_to_source" flow and 1 is "source_to_target". An entry adds `weight * x[col]` to
+    the output of node `row` in the given direction. Entries are sorted by (row, direction),
+    so they stay sorted after batching.
+    """
+    (rows, directions, cols, weights) = ([], [], [], [])
+    for (direction, flow) in enumerate(("target_to_source", "source_to_target")):
+        (index, weight) = normalized_edges(edge_index, num_nodes, flow)
+        # "source_to_target" aggregates x[index[0]] into index[1], "target_to_source" x[index[1]]
+        # into index[0]
+        (row, col) = (index[1], index[0]) if flow == "source_to_target" else (index[0], index[1])
+        rows.append(row)
+        cols.append(col)
+        directions.append(torch.full_like(row, direction))
+        weights.append(weight.float())
+
+    (row, direction, col) = (torch.cat(rows), torch.cat(directions), torch.cat(cols))
+    order = torch.argsort(row * 2 + direction)
+    return row[order], direction[order], col[order], torch.cat(weights)[order]
+
+
+class PrecomputeAdjacency:
+    """
+    Transform that stores the normalized adjacency used by `FusedGCN` in a `Data` object, so
+    that it is computed only once per graph. The row and column attributes are named
+    `*_index`, so PyG offsets them when graphs are batched.
+    """
+
+    def __call__(self, data: Data) -> Data:
+        (row, direction, col, weight) = gcn_adjacency(data.edge_index, data.num_nodes)
+        data.gcn_row_index = row
+        data.gcn_col_index = col
+        data.gcn_direction = direction
+        data.gcn_weight = weight
+        return data
+
+
+def conv_weight(conv: GCNConv) -> torch.Tensor:
+    # (in, out) weight, newer PyG versions keep it in a bias-free Linear layer
+    if hasattr(conv, "lin"):
+        return conv.lin.weight.t()
+    return conv.weight
+
+
+def graph_ptr(data, num_nodes: int) -> torch.Tensor:
+    """
+    Returns the node offsets of the graphs in a batch (or in a single graph).
+    """
+    ptr = getattr(data, "ptr", None)
+    if ptr is not None:
+        return ptr
+    batch = getattr(data, "batch", None)
+    if batch is None:
+        return torch.tensor([0, num_nodes], device=data.x.device)
+    counts = torch.bincount(batch)
+    return torch.cat((counts.new_zeros(1), torch.cumsum(counts, 0)))
+
+
+class FusedGCN(GCN):
+    """
+    Computes the same function as `GCN` with the same parameters (and state dict), but faster
+    on large graphs:
+    - Both directions of the first layer are a single sparse multiplication of the inputs
+    followed by one dense multiplication with both weight matrices. The inputs have fewer
+    columns than the hidden layer, so they are aggregated before the linear layer.
+    - The normalized adjacency is taken from `PrecomputeAdjacency` if the batch contains it.
+    - Pooling takes two segment reductions over the batch `ptr` instead of three scatters:
+    sum and max (torch_scatter has no kernel computing both in one pass) and the mean is
+    derived from the sum.
+    """
+
+    def adjacency(self, data) -> Tuple[SparseTensor, SparseTensor]:
+        num_nodes = data.num_nodes
+        if "gcn_weight" in data:
+            (row, direction, col, weight) = (data.gcn_row_index, data.gcn_direction,
+                                             data.gcn_col_index, data.gcn_weight)
+        else:
+            (row, direction, col, weight) = gcn_adjacency(data.edge_index, num_nodes)
+        # Rows of both directions are interleaved, so that the product can be reshaped into
+        # (nodes, 2 * features)
+        both = SparseTensor(row=row * 2 + direction, col=col, value=weight,
+                            sparse_sizes=(2 * num_nodes, num_nodes), is_sorted=True)
+        forward = direction == 1
+        source_to_target = SparseTensor(row=row[forward], col=col[forward],
+                                        value=weight[forward],
+                                        sparse_sizes=(num_nodes, num_nodes), is_sorted=True)
+        return both, source_to_target
+
+    def forward(self, data):
+        x = data.x
+        num_nodes = x.size(0)
+        (both, source_to_target) = self.adjacency(data)
+
+        x = matmul(both, x).view(num_nodes, -1)
+        weight = torch.block_diag(conv_weight(self.conv1), conv_weight(self.conv2))
+        x = x @ weight + torch.cat([self.conv1.bias, self.conv2.bias])
+        x = F.relu(x)
+
+        x = matmul(source_to_target, x @ conv_weight(self.conv3)) + self.conv3.bias
+        x = F.relu(x)
+
+        x = self.node_head1(x)
+        x = F.relu(x)
+
+        ptr = graph_ptr(data, num_nodes)
+        sum = segment_csr(x, ptr, reduce="sum")
+        max = segment_csr(x, ptr, reduce="max")
+        counts = (ptr[1:] - ptr[:-1]).clamp(min=1).unsqueeze(1)
+
+        x = torch.cat([sum, sum / counts, max], axis=1)
+        x = self.graph_head(x)
+        return x
+
+
+def pool_graphs(x: torch.Tensor, batch: torch.Tensor) -> torch.Tensor:
+    return torch.cat([global_add_pool(x, batch), global_mean_pool(x, batch),
+                      global_max_pool(x, batch)], axis=1)
+
+
+class TwoWayGNN(torch.nn.Module):
+    """
+    The structure of `GCN` with arbitrary convolutions: `conv1` and `conv2` process the inputs
+    against and along the edges, `conv3` combines them and the node embeddings are pooled
+    with sum, mean and max.
+    """
+
+    def __init__(self, conv1: torch.nn.Module, conv2: torch.nn.Module, conv3: torch.nn.Module):
+        super().__init__()
+        self.conv1 = conv1
+        self.conv2 = conv2
+        self.conv3 = conv3
+        self.node_head1 = torch.nn.Linear(64, 32)
+        self.graph_head = torch.nn.Linear(96, 1)
+
+    def forward(self, data):
+        x, edge_index = data.x, data.edge_index
+        x = torch.cat([self.conv1(x, edge_index), self.conv2(x, edge_index)], axis=-1)
+        x = F.relu(x)
+        x = F.relu(self.conv3(x, edge_index))
+        x = F.relu(self.node_head1(x))
+        return self.graph_head(pool_graphs(x, data.batch))
+
+
+class GAT(TwoWayGNN):
+    def __init__(self, num_features: int, heads=4):
+        super().__init__(
+            GATConv(num_features, 32 // heads, heads=heads, flow="target_to_source"),
+            GATConv(num_features, 32 // heads, heads=heads, flow="source_to_target"),
+            GATConv(64, 64 // heads, heads=heads)
+        )
+
+
+def _mlp(in_channels: int, out_channels: int) -> torch.nn.Module:
+    return torch.nn.Sequential(torch.nn.Linear(in_channels, out_channels), torch.nn.ReLU(),
+                               torch.nn.Linear(out_channels, out_channels))
+
+
+class GIN(TwoWayGNN):
+    def __init__(self, num_features: int):
+        super().__init__(
+            GINConv(_mlp(num_features, 32), flow="target_to_source"),
+            GINConv(_mlp(num_features, 32), flow="source_to_target"),
+            GINConv(_mlp(64, 64))
+        )
+
+
+def dag_levels(edge_index: torch.Tensor, num_nodes: int) -> torch.Tensor:
+    """
+    Topological level (longest path in edges from a source) of every node.
+    """
+    levels = topological_levels(num_nodes, edge_index.cpu().numpy())
+    return torch.from_numpy(levels).to(edge_index.device)
+
+
+class PrecomputeLevels:
+    """
+    Transform that stores the topological levels used by `DAGPropagation` in a `Data` object,
+    so that they are computed only once per graph. Levels are local to each graph, so they
+    stay valid after batching.
+    """
+
+    def __call__(self, data: Data) -> Data:
+        data.dag_level = dag_levels(data.edge_index, data.num_nodes)
+        return data
+
+
+@dataclasses.dataclass()
+class LevelSchedule:
+    """
+    Nodes and edges of a DAG grouped by topological level, shared by both directions of
+    `DAGPropagation`. The nodes of level `l` are `node_order[node_bounds[l]:node_bounds[l + 1]]`,
+    edges are grouped by the level of their target (`forward_*`) or of their source
+    (`backward_*`).
+    """
+    node_order: torch.Tensor
+    node_bounds: List[int]
+    # Position of every node among the nodes of its level
+    position: torch.Tensor
+    forward_order: torch.Tensor
+    forward_bounds: List[int]
+    backward_order: torch.Tensor
+    backward_bounds: List[int]
+
+    def edges(self, reverse: bool) -> Tuple[torch.Tensor, List[int]]:
+        if reverse:
+            return (self.backward_order, self.backward_bounds)
+        return (self.forward_order, self.forward_bounds)
+
+
+def level_schedule(edge_index: torch.Tensor, levels: torch.Tensor) -> LevelSchedule:
+    """
+    Groups nodes and edges by level. Level sizes are counted with `bincount`, so the only
+    host synchronization is a single transfer of all the bounds.
+    """
+    level_count = int(levels.max()) + 1
+    orders = []
+    counts = []
+    for keys in (levels, levels[edge_index[1]], levels[edge_index[0]]):
+        orders.append(torch.argsort(keys))
+        counts.append(torch.bincount(keys, minlength=level_count))
+    bounds = F.pad(torch.stack(counts).cumsum(dim=1), (1, 0))
+    node_order = orders[0]
+    position = torch.empty_like(levels)
+    position[node_order] = torch.arange(levels.size(0), device=levels.device) - \
+        bounds[0][levels[node_order]]
+    (node_bounds, forward_bounds, backward_bounds) = bounds.tolist()
+    return LevelSchedule(node_order, node_bounds, position, orders[1], forward_bounds,
+                         orders[2], backward_bounds)
+
+
+class DAGPropagation(torch.nn.Module):
+    """
+    Processes the nodes of a DAG level by level, in topological order or in reverse
+    topological order with `reverse`. The state of a node is computed by a GRU cell from its
+    input features and the aggregated (`max` or `sum`) states of its predecessors (successors
+    with `reverse`), so information flows over paths of any length in a single pass. With
+    `reverse` and `max`, this mirrors the computation of b-levels.
+
+    Every node and edge is processed once and all graphs of a batch are processed together,
+    the number of sequential steps is the depth of the deepest graph. A `LevelSchedule` can be
+    passed in to share it with the propagation in the other direction.
+    """
+
+    def __init__(self, in_channels: int, channels: int, aggr="max", reverse=False):
+        super().__init__()
+        self.channels = channels
+        self.aggr = aggr
+        self.reverse = reverse
+        self.cell = torch.nn.GRUCell(in_channels, channels)
+
+    def forward(self, x: torch.Tensor, edge_index: torch.Tensor,
+                levels: Optional[torch.Tensor] = None,
+                schedule: Optional[LevelSchedule] = None) -> torch.Tensor:
+        num_nodes = x.size(0)
+        if num_nodes == 0:
+            return x.new_zeros(0, self.channels)
+        if schedule is None:
+            if levels is None:
+                levels = dag_levels(edge_index, num_nodes)
+            schedule = level_schedule(edge_index, levels)
+        # Messages go from `src` to `dst`, `dst` is always processed after `src`
+        (src, dst) = (edge_index[1], edge_index[0]) if self.reverse else edge_index
+        (node_order, node_bounds, position) = (schedule.node_order, schedule.node_bounds,
+                                               schedule.position)
+        (edge_order, edge_bounds) = schedule.edges(self.reverse)
+        level_count = len(node_bounds) - 1
+
+        h = x.new_zeros(num_nodes, self.channels)
+        steps = reversed(range(level_count)) if self.reverse else range(level_count)
+        for level in steps:
+            nodes = node_order[node_bounds[level]:node_bounds[level + 1]]
+            edges = edge_order[edge_bounds[level]:edge_bounds[level + 1]]
+            state = scatter(h[src[edges]], position[dst[edges]], dim=0, dim_size=len(nodes),
+                            reduce=self.aggr)
+            h.index_copy_(0, nodes, self.cell(x[nodes], state))
+        return h
+
+
+class DAGNet(torch.nn.Module):
+    """
+    Propagates the node features through the whole graph towards the sinks (like t-levels)
+    and towards the sources (like b-levels) and pools the combined node states.
+    """
+
+    def __init__(self, num_features: int):
+        super().__init__()
+        self.forward_propagation = DAGPropagation(num_features, 32)
+        self.backward_propagation = DAGPropagation(num_features, 32, reverse=True)
+        self.node_head1 = torch.nn.Linear(64, 32)
+        self.graph_head = torch.nn.Linear(96, 1)
+
+    def forward(self, data):
+        x, edge_index = data.x, data.edge_index
+        levels = getattr(data, "dag_level", None)
+        if levels is None:
+            levels = dag_levels(edge_index, x.size(0))
+        schedule = level_schedule(edge_index, levels) if x.size(0) > 0 else None
+        x = torch.cat([self.forward_propagation(x, edge_index, schedule=schedule),
+                       self.backward_propagation(x, edge_index, schedule=schedule)], axis=-1)
+        x = F.relu(self.node_head1(x))
+        return self.graph_head(pool_graphs(x, data.batch))
+
+
+# Each model is created from the number of node features
+MODELS: Dict[str, Callable[[int], torch.nn.Module]] = {
+    "gcn": GCN,
+    "fused-gcn": FusedGCN,
+    "gat": GAT,
+    "gin": GIN,
+    "dag": DAGNet,
+}
+
+# Transforms that precompute per-graph data used by a model, applied to the dataset once
+MODEL_TRANSFORMS: Dict[str, Callable[[], Callable[[Data], Data]]] = {
+    "fused-gcn": PrecomputeAdjacency,
+    "dag": PrecomputeLevels,
+}
+
+
+def model_transform(model: str) -> Optional[Callable[[Data], Data]]:
+    transform = MODEL_TRANSFORMS.get(model)
+    return transform() if transform is not None else None
+
+
+class MakespanPredictor(pl.LightningModule):
+    def __init__(self, num_features: int, learning_rate: float,
+                 denormalizer: Denormalizer = None,
+                 features: Sequence[str] = DEFAULT_FEATURES.features, model="gcn"):
+        super().__init__()
+        if model not in MODELS:
+            raise ValueError(f"Unknown model {model}, available: {list(MODELS)}")
+        self.save_hyperparameters(ignore=["denormalizer"])
+        self.module = MODELS[model](num_features)
+        self.learning_rate = learning_rate
+        self.denormalizer = denormalizer or Denormalizer()
+        self.mae = MeanAbsoluteError()
+
+    def forward(self, x):
+        return self.module(x)
+
+    def configure_optimizers(self):
+        return torch.optim.Adam(self.parameters(), lr=self.learning_rate, weight_decay=5e-4)
+
+    def training_step(self, train_batch, batch_idx):
+        return self.step(train_batch, "loss")[2]
+
+    def validation_step(self, val_batch, batch_idx):
+        with torch.inference_mode():
+            pred, gt, loss = self.step(val_batch, "val_loss")
+            pred_dn = self.denormalizer.denormalize(pred, val_batch)
+            gt_dn = self.denormalizer.denormalize(gt, val_batch)
+            acc = self.mae(pred_dn, gt_dn)
+            self.log("val_mae", acc, prog_bar=True)
+
+    def step(self, batch: Data, loss_name: str):
+        pred = self.module(batch)
+        gt = batch.y.unsqueeze(1)
+        loss = F.mse_loss(pred, gt)
+        prog_bar = "val" in loss_name
+        self.log(loss_name, loss, prog_bar=prog_bar)
+        return pred, gt, loss
@@ -0,0 +1,113 @@
+import contextlib
+import multiprocessing
+import random
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+
+from .data import TrainExample
+from .generator import simulate_graph
+from .simcache import SimulationCache
+
+
+def seed_everything(seed: int):
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+@contextlib.contextmanager
+def seeded(seed: int):
+    """
+    Seeds the global random generators (which are used by the graph generators and the
+    simulator) within the block and restores their previous state afterwards, so that the
+    random state of the calling process is not affected.
+    """
+    state = (random.getstate(), np.random.get_state())
+    seed_everything(seed)
+    try:
+        yield
+    finally:
+        random.setstate(state[0])
+        np.random.set_state(state[1])
+
+
+def item_seed(seed: int, index: int) -> int:
+    return int(np.random.SeedSequence([seed, index]).generate_state(1)[0])
+
+
+class _Seeded:
+    def __init__(self, fn: Callable, seed: int):
+        self.fn = fn
+        self.seed = seed
+
+    def __call__(self, item):
+        (index, value) = item
+        with seeded(item_seed(self.seed, index)):
+            return self.fn(value)
+
+
+def parallel_map(fn: Callable, items: Iterable, processes: Optional[int] = None, seed=0,
+                 chunksize=4, start_index=0, initializer: Optional[Callable] = None,
+                 initargs=()) -> Iterator:
+    """
+    Lazily maps `fn` over `items` in a process pool and yields the results in input order.
+
+    The random generators are reseeded before each item with a seed derived from `seed` and the
+    index of the item (counted from `start_index`), so the results do not depend on the number
+    of processes.
+    `fn` has to be picklable (e.g. a top-level function). `initializer(*initargs)` is called
+    once in every process before any item is processed.
+    """
+    task = _Seeded(fn, seed)
+    items = enumerate(items, start_index)
+    if processes == 1:
+        if initializer is not None:
+            initializer(*initargs)
+        yield from map(task, items)
+        return
+
+    with multiprocessing.Pool(processes, initializer=initializer, initargs=initargs) as pool:
+        yield from pool.imap(task, items, chunksize=chunksize)
+
+
+# Simulation cache of the current `generate_rows` call, set once in every worker process
+_cache: Optional[SimulationCache] = None
+
+
+def _set_cache(cache: Optional[SimulationCache]):
+    global _cache
+    _cache = cache
+
+
+def _simulate(example: TrainExample) -> float:
+    return simulate_graph(example, cache=_cache)
+
+
+def simulate_examples(examples: Iterable[TrainExample], processes: Optional[int] = None, seed=0,
+                      cache: Optional[SimulationCache] = None) -> Iterator[float]:
+    """
+    Simulates examples in a process pool and yields their makespans in input order.
+    """
+    return parallel_map(_simulate, examples, processes=processes, seed=seed,
+                        initializer=_set_cache, initargs=(cache,))
+
+
+class _GenerateAndSimulate:
+    def __init__(self, generate: Callable[[int], TrainExample]):
+        self.generate = generate
+
+    def __call__(self, index: int) -> Tuple[TrainExample, float]:
+        example = self.generate(index)
+        return example, simulate_graph(example, cache=_cache)
+
+
+def generate_rows(generate: Callable[[int], TrainExample], count: int,
+                  processes: Optional[int] = None, seed=0, start=0,
+                  cache: Optional[SimulationCache] = None) -> Iterator[Tuple[TrainExample, float]]:
+    """
+    Generates examples with indices `start..count` with `generate(index)` and simulates them.
+    Yields (example, makespan) rows in index order as soon as they are finished.
+    """
+    return parallel_map(_GenerateAndSimulate(generate), range(start, count),
+                        processes=processes, seed=seed, start_index=start,
+                        initializer=_set_cache, initargs=(cache,))
@@ -0,0 +1,135 @@
+import itertools
+import queue
+import threading
+from typing import Callable, Iterable, Optional
+
+import torch
+from torch_geometric.loader import DataLoader
+
+from .conversion import example_to_data
+from .data import TrainExample
+from .features import DEFAULT_FEATURES, FeatureConfig
+from .generator import simulate_graph
+from .parallel import item_seed, seeded
+
+
+def make_loader(dataset, batch_size=64, shuffle=False, num_workers=0, pin_memory=False,
+                prefetch_factor=2, batch_sampler=None) -> DataLoader:
+    """
+    Creates a PyG DataLoader that loads and collates batches in `num_workers` background
+    processes. Collated batches are passed back to the training process through shared memory
+    and each worker keeps `prefetch_factor` batches ready in advance.
+    With `num_workers=0`, batches are collated in a background thread of the training process
+    instead (see `PrefetchingDataLoader`), `prefetch_factor=0` disables it.
+    """
+    kwargs = {}
+    if num_workers > 0:
+        kwargs = dict(prefetch_factor=prefetch_factor, persistent_workers=True)
+    if batch_sampler is not None:
+        kwargs["batch_sampler"] = batch_sampler
+    else:
+        kwargs.update(batch_size=batch_size,
+                      shuffle=shuffle and not isinstance(dataset, torch.utils.data.IterableDataset))
+    if num_workers == 0 and prefetch_factor > 0:
+        return PrefetchingDataLoader(dataset, prefetch_depth=prefetch_factor,
+                                     pin_memory=pin_memory, **kwargs)
+    return DataLoader(dataset, num_workers=num_workers, pin_memory=pin_memory, **kwargs)
+
+
+class Prefetcher:
+    """
+    Iterates `iterable` in a background thread, keeping up to `depth` items ready.
+    Useful with `num_workers=0`, where the DataLoader itself does not prefetch.
+    """
+
+    def __init__(self, iterable: Iterable, depth=2):
+        self.iterable = iterable
+        self.depth = depth
+
+    def __len__(self):
+        return len(self.iterable)
+
+    def __iter__(self):
+        items = queue.Queue(maxsize=self.depth)
+        end = object()
+        stop = threading.Event()
+
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    items.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            try:
+                for item in self.iterable:
+                    if not put(item):
+                        return
+                put(end)
+            except Exception as e:
+                put(e)
+
+        thread = threading.Thread(target=produce, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = items.get()
+                if item is end:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            thread.join()
+
+
+class PrefetchingDataLoader(DataLoader):
+    """
+    DataLoader without worker processes that loads and collates the next `prefetch_depth`
+    batches in a background thread while the current batch is being processed.
+    """
+
+    def __init__(self, *args, prefetch_depth=2, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prefetch_depth = prefetch_depth
+
+    def __iter__(self):
+        return iter(Prefetcher(super().__iter__(), depth=self.prefetch_depth))
+
+
+class SimulatedGraphStream(torch.utils.data.IterableDataset):
+    """
+    Generates and simulates fresh graphs on the fly, so a model can be trained on an unbounded
+    stream of examples. `generate(index)` creates the example with the given index.
+
+    With multiple DataLoader workers, example indices are interleaved among the workers and each
+    example is generated with random generators seeded by (seed, index), so the stream
+    contains the same examples regardless of the number of workers.
+    With `count=None` the stream is infinite.
+    """
+
+    def __init__(self, generate: Callable[[int], TrainExample], count: Optional[int] = None,
+                 seed=0, config: FeatureConfig = DEFAULT_FEATURES):
+        super().__init__()
+        self.generate = generate
+        self.count = count
+        self.seed = seed
+        self.config = config
+
+    def __iter__(self):
+        worker = torch.utils.data.get_worker_info()
+        (start, step) = (0, 1) if worker is None else (worker.id, worker.num_workers)
+        if self.count is None:
+            indices = itertools.count(start, step)
+        else:
+            indices = range(start, self.count, step)
+
+        for index in indices:
+            with seeded(item_seed(self.seed, index)):
+                example = self.generate(index)
+                makespan = simulate_graph(example)
+            yield example_to_data(example, makespan, config=self.config)
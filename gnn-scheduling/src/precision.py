@@ -0,0 +1,106 @@
+import copy
+import dataclasses
+import warnings
+from typing import Dict, Optional
+
+import torch
+from torch_geometric.nn import GCNConv
+
+# Linear layers of the models that are quantized to int8
+HEAD_LAYERS = ("node_head1", "graph_head")
+
+
+@dataclasses.dataclass(frozen=True)
+class Precision:
+    # Quantize the weights of `HEAD_LAYERS` to int8 (activations are quantized dynamically)
+    int8_heads: bool = False
+    # Evaluate the GCNConv layers in this dtype instead of float32
+    conv_dtype: Optional[torch.dtype] = None
+
+
+PRECISIONS: Dict[str, Precision] = {
+    "fp32": Precision(),
+    "int8": Precision(int8_heads=True),
+    "int8-bf16": Precision(int8_heads=True, conv_dtype=torch.bfloat16),
+    "int8-fp16": Precision(int8_heads=True, conv_dtype=torch.float16),
+}
+
+
+class ReducedPrecisionConv(torch.nn.Module):
+    """
+    Evaluates a GCNConv in `dtype`, its inputs and outputs stay in float32.
+    """
+
+    def __init__(self, conv: GCNConv, dtype: torch.dtype):
+        super().__init__()
+        self.conv = conv.to(dtype)
+        self.dtype = dtype
+
+    def forward(self, x: torch.Tensor, edge_index: torch.Tensor) -> torch.Tensor:
+        return self.conv(x.to(self.dtype), edge_index).float()
+
+
+def int8_supported() -> bool:
+    """
+    Checks that this CPU has a quantized engine (fbgemm on x86, qnnpack on ARM).
+    """
+    try:
+        layer = torch.quantization.quantize_dynamic(torch.nn.Sequential(torch.nn.Linear(2, 2)),
+                                                    {torch.nn.Linear}, dtype=torch.qint8)
+        with torch.inference_mode():
+            layer(torch.ones(1, 2))
+        return True
+    except (RuntimeError, AssertionError):
+        return False
+
+
+def conv_dtype_supported(dtype: torch.dtype) -> bool:
+    """
+    Checks that GCNConv (including its sparse aggregation) has CPU kernels for `dtype`.
+    """
+    try:
+        conv = GCNConv(2, 2).to(dtype)
+        with torch.inference_mode():
+            conv(torch.ones(3, 2, dtype=dtype), torch.tensor([[0, 1], [1, 2]]))
+        return True
+    except RuntimeError:
+        return False
+
+
+def reduce_precision(module: torch.nn.Module, precision="fp32") -> torch.nn.Module:
+    """
+    Returns a CPU inference copy of `module` with the given precision (see `PRECISIONS`).
+    Parts that are not supported by the model or by this machine are kept in float32 with a
+    warning.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision}, available: {list(PRECISIONS)}")
+    config = PRECISIONS[precision]
+    module = copy.deepcopy(module).cpu().eval()
+
+    if config.int8_heads:
+        if int8_supported():
+            module = torch.quantization.quantize_dynamic(module, set(HEAD_LAYERS),
+                                                         dtype=torch.qint8)
+        else:
+            warnings.warn("int8 quantization is not supported on this machine, "
+                          "using float32 heads")
+
+    if config.conv_dtype is not None:
+        from .model import FusedGCN
+
+        if isinstance(module, FusedGCN):
+            # The fused model multiplies by the conv weights directly instead of calling the
+            # convolutions
+            warnings.warn("Reduced precision convolutions are not supported by fused-gcn")
+        elif not conv_dtype_supported(config.conv_dtype):
+            warnings.warn(f"GCNConv does not support {config.conv_dtype} on this machine, "
+                          "using float32 convolutions")
+        else:
+            convs = [(name, child) for (name, child) in module.named_children()
+                     if isinstance(child, GCNConv)]
+            if not convs:
+                warnings.warn(f"{type(module).__name__} has no GCNConv layers")
+            for (name, conv) in convs:
+                setattr(module, name, ReducedPrecisionConv(conv, config.conv_dtype))
+    return module
@@ -0,0 +1,96 @@
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+
+from .store import GraphStore
+
+
+def graph_sizes(dataset) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns (node_counts, edge_counts) of all graphs in a dataset.
+    """
+    if isinstance(dataset, GraphStore):
+        return dataset.node_counts(), dataset.edge_counts()
+    node_counts = np.fromiter((data.num_nodes for data in dataset), dtype=np.int64,
+                              count=len(dataset))
+    edge_counts = np.fromiter((data.num_edges for data in dataset), dtype=np.int64,
+                              count=len(dataset))
+    return node_counts, edge_counts
+
+
+class NodeBudgetBatchSampler(torch.utils.data.Sampler):
+    """
+    Groups graphs of similar size into batches whose total node count (and optionally edge count)
+    does not exceed a budget, so that the memory used by a batch does not depend on which graphs
+    were sampled into it. A graph larger than the budget forms a batch on its own.
+
+    Graphs are put into size buckets whose node counts differ by less than `bucket_ratio`.
+    Every bucket holds a fixed number of graphs per batch, given by the budget and the largest
+    graph of the bucket, so the number of batches is the same in every epoch.
+
+    Use it as `DataLoader(dataset, batch_sampler=NodeBudgetBatchSampler(...))`.
+    With `shuffle`, graphs are assigned to batches randomly within their bucket and the order of
+    the batches is shuffled in every epoch.
+    """
+
+    def __init__(self, node_counts: Sequence[int], max_nodes: int,
+                 edge_counts: Optional[Sequence[int]] = None, max_edges: Optional[int] = None,
+                 shuffle=True, seed=0, bucket_ratio=1.25):
+        self.node_counts = np.asarray(node_counts, dtype=np.int64)
+        self.edge_counts = None if edge_counts is None else np.asarray(edge_counts, dtype=np.int64)
+        self.max_nodes = max_nodes
+        self.max_edges = max_edges
+        if max_edges is not None and edge_counts is None:
+            raise ValueError("max_edges requires edge_counts")
+        if bucket_ratio <= 1:
+            raise ValueError("bucket_ratio has to be larger than 1")
+        self.shuffle = shuffle
+        self.generator = np.random.default_rng(seed)
+        self.buckets = self._buckets(bucket_ratio)
+        self.length = sum(-(-len(bucket) // capacity) for (bucket, capacity) in self.buckets)
+
+    @staticmethod
+    def for_dataset(dataset, max_nodes: int, max_edges: Optional[int] = None,
+                    shuffle=True, seed=0) -> "NodeBudgetBatchSampler":
+        (node_counts, edge_counts) = graph_sizes(dataset)
+        return NodeBudgetBatchSampler(node_counts, max_nodes, edge_counts=edge_counts,
+                                      max_edges=max_edges, shuffle=shuffle, seed=seed)
+
+    def _sort_keys(self) -> Tuple[np.ndarray, ...]:
+        # The last key of np.lexsort is the primary one
+        if self.edge_counts is None:
+            return (self.node_counts,)
+        return (self.edge_counts, self.node_counts)
+
+    def _buckets(self, bucket_ratio: float) -> List[Tuple[np.ndarray, int]]:
+        """
+        Returns (graph indices sorted by size, graphs per batch) of every size bucket.
+        """
+        order = np.lexsort(self._sort_keys())
+        if len(order) == 0:
+            return []
+        keys = np.floor(np.log(np.maximum(self.node_counts[order], 1)) / np.log(bucket_ratio))
+        starts = np.flatnonzero(np.diff(keys, prepend=-1))
+        buckets = []
+        for bucket in np.split(order, starts[1:]):
+            capacity = self.max_nodes // max(int(self.node_counts[bucket].max()), 1)
+            if self.max_edges is not None:
+                edges = max(int(self.edge_counts[bucket].max()), 1)
+                capacity = min(capacity, self.max_edges // edges)
+            buckets.append((bucket, max(capacity, 1)))
+        return buckets
+
+    def __iter__(self) -> Iterator[List[int]]:
+        batches = []
+        for (bucket, capacity) in self.buckets:
+            if self.shuffle:
+                bucket = self.generator.permutation(bucket)
+            bucket = bucket.tolist()
+            batches.extend(bucket[i:i + capacity] for i in range(0, len(bucket), capacity))
+        if self.shuffle:
+            self.generator.shuffle(batches)
+        return iter(batches)
+
+    def __len__(self):
+        return self.length
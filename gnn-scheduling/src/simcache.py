@@ -0,0 +1,104 @@
+import os
+import sqlite3
+import time
+from typing import Optional
+
+# Bump when the simulator setup changes in a way that invalidates cached makespans
+SIMULATION_VERSION = 3
+
+
+class SimulationCache:
+    """
+    Persistent memoization of simulated makespans in a SQLite database.
+
+    Entries are keyed by a canonical graph hash and the cluster/scheduler configuration
+    (see `key`), so isomorphic graphs share their entry.
+    When the number of entries exceeds `max_entries`, the least recently used ones are removed.
+    The cache can be passed to worker processes, each process opens its own connection.
+    Pass it to a process pool through the pool initializer (see `parallel.generate_rows`), so
+    that each worker opens the database only once.
+    """
+
+    def __init__(self, path: str, max_entries=1_000_000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._connection = None
+        self._pid = None
+        self._size = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None or self._pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=60)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""CREATE TABLE IF NOT EXISTS simulations (
+                key TEXT PRIMARY KEY,
+                makespan REAL NOT NULL,
+                last_used REAL NOT NULL
+            )""")
+            connection.execute("CREATE INDEX IF NOT EXISTS simulations_last_used "
+                               "ON simulations(last_used)")
+            connection.commit()
+            self._connection = connection
+            self._pid = os.getpid()
+            # Counted lazily by `put`, reading and counting a large table is not cheap
+            self._size = None
+        return self._connection
+
+    @staticmethod
+    def key(graph_hash: str, worker_count: int, cpus: int, netmodel: str, scheduler: str) -> str:
+        return f"{SIMULATION_VERSION}:{graph_hash}:{worker_count}:{cpus}:{netmodel}:{scheduler}"
+
+    def get(self, key: str) -> Optional[float]:
+        connection = self.connection
+        row = connection.execute("SELECT makespan FROM simulations WHERE key = ?",
+                                 (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        with connection:
+            connection.execute("UPDATE simulations SET last_used = ? WHERE key = ?",
+                               (time.time(), key))
+        self.hits += 1
+        return row[0]
+
+    def put(self, key: str, makespan: float):
+        connection = self.connection
+        with connection:
+            inserted = connection.execute(
+                "INSERT OR IGNORE INTO simulations (key, makespan, last_used) VALUES (?, ?, ?)",
+                (key, makespan, time.time())).rowcount
+        if self._size is None:
+            self._size = len(self)
+        else:
+            self._size += inserted
+        if self._size > self.max_entries:
+            self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries, leaving some free space so that eviction
+        does not run on every insert.
+        """
+        connection = self.connection
+        with connection:
+            size = connection.execute("SELECT COUNT(*) FROM simulations").fetchone()[0]
+            target = int(self.max_entries * 0.9)
+            if size > target:
+                connection.execute("""DELETE FROM simulations WHERE key IN (
+                    SELECT key FROM simulations ORDER BY last_used LIMIT ?
+                )""", (size - target,))
+                size = target
+        self._size = size
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM simulations").fetchone()[0]
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_connection"] = None
+        state["_pid"] = None
+        state["_size"] = None
+        return state
@@ -0,0 +1,85 @@
+import dataclasses
+from typing import Iterable, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .conversion import example_structure
+from .data import TrainExample
+from .hashing import structure_graph_hash
+
+
+@dataclasses.dataclass()
+class Split:
+    train: np.ndarray
+    validation: np.ndarray
+    # Examples of held-out families
+    test: np.ndarray
+
+
+def examples_metadata(examples: Iterable[TrainExample]) -> pd.DataFrame:
+    """
+    Builds split metadata for examples that are already in memory.
+    For datasets on disk, use `dataset_metadata` or `GraphStore.metadata` instead.
+    """
+    rows = []
+    for example in examples:
+        structure = example_structure(example)
+        rows.append({
+            "hash": structure_graph_hash(structure, weighted=True),
+            "task_count": structure.task_count,
+            "family": example.family,
+            "worker_count": example.worker_count
+        })
+    return pd.DataFrame(rows, columns=["hash", "task_count", "family", "worker_count"])
+
+
+def size_buckets(task_counts: np.ndarray, bucket_count=4) -> np.ndarray:
+    """
+    Assigns graphs into (at most) `bucket_count` buckets of similar size using quantiles of the
+    task counts.
+    """
+    task_counts = np.asarray(task_counts)
+    if len(task_counts) == 0:
+        return np.zeros(0, dtype=np.int64)
+    quantiles = np.linspace(0, 1, bucket_count + 1)[1:-1]
+    edges = np.unique(np.quantile(task_counts, quantiles))
+    return np.searchsorted(edges, task_counts, side="right")
+
+
+def stratified_split(metadata: pd.DataFrame, validation=0.2,
+                     holdout_families: Sequence[str] = (), bucket_count=4, seed=0) -> Split:
+    """
+    Splits a dataset into train and validation row indices using only its metadata (columns
+    `hash`, `task_count`, `family` and `worker_count`).
+
+    Each stratum (family, size bucket, worker count) contributes approximately `validation` of
+    its rows to the validation set. Rows of the same graph (equal `hash`) always end up on the
+    same side, even if they were simulated with different worker counts, so that the
+    validation set does not contain graphs seen during training.
+    All rows of `holdout_families` are put into the test set.
+    """
+    family = metadata["family"].fillna("").to_numpy(dtype=object)
+    held_out = np.isin(family, list(holdout_families))
+    rows = np.flatnonzero(~held_out)
+
+    strata = pd.DataFrame({
+        "family": family[rows],
+        "bucket": size_buckets(metadata["task_count"].to_numpy()[rows], bucket_count),
+        "worker_count": metadata["worker_count"].to_numpy()[rows]
+    })
+    stratum = strata.groupby(list(strata.columns), sort=True).ngroup().to_numpy()
+    (group, _) = pd.factorize(metadata["hash"].to_numpy()[rows])
+
+    # A group belongs to the stratum of its first row, groups are visited in random order
+    groups = pd.DataFrame({"group": group, "stratum": stratum}).groupby("group", sort=True)
+    groups = pd.DataFrame({"stratum": groups["stratum"].first(), "size": groups.size()})
+    groups["key"] = np.random.default_rng(seed).random(len(groups))
+    groups = groups.sort_values(["stratum", "key"])
+    stratum_sizes = groups.groupby("stratum")["size"].transform("sum")
+    filled = groups.groupby("stratum")["size"].cumsum() - groups["size"] / 2
+    validation_groups = groups.index[filled < stratum_sizes * validation].to_numpy()
+
+    in_validation = np.isin(group, validation_groups)
+    return Split(train=rows[~in_validation], validation=rows[in_validation],
+                 test=np.flatnonzero(held_out))
@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import torch
+from torch_geometric.data import Data
+
+from .conversion import example_to_data
+from .dataset import iter_dataset
+from .hashing import weighted_hash
+
+META_FILE = "meta.json"
+
+# Bump when the layout of the store changes
+# 1: initial layout, 2: family_ids and hashes
+STORE_VERSION = 2
+
+# Per-graph arrays, every array is stored as a raw contiguous file `<name>.bin`
+GRAPH_ARRAYS = {
+    "node_offsets": np.int64,
+    "edge_offsets": np.int64,
+    "worker_counts": np.int64,
+    # Index into the `families` list of the metadata, -1 for graphs without a family
+    "family_ids": np.int32,
+    # Prefix of the canonical graph hash, used for grouping duplicate graphs
+    "hashes": np.uint64,
+    "makespans": np.float32,
+    "normalization": np.float32,
+}
+
+# Store version that introduced each array, arrays missing in older stores are filled by
+# `_missing_array`
+ARRAY_VERSIONS = {
+    "family_ids": 2,
+    "hashes": 2,
+}
+
+
+def array_path(path: str, name: str) -> str:
+    return os.path.join(path, f"{name}.bin")
+
+
+class GraphStoreWriter:
+    """
+    Writes already converted PyG `Data` objects into a columnar binary store.
+
+    Node features of all graphs are concatenated into a single (nodes, features) matrix and
+    edges into a single (edges, 2) matrix with node indices local to each graph, sorted by
+    source node (the order of a CSR adjacency). Per-graph offsets into these arrays are written
+    on `close`.
+
+    `graph_hash` (a canonical hash, see `hashing.weighted_hash`) groups duplicate graphs in
+    the split. When it is not given, a digest of the converted graph is stored instead, which
+    only groups graphs whose features and task order are identical.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.x_file = open(array_path(path, "x"), "wb")
+        self.edges_file = open(array_path(path, "edges"), "wb")
+        self.node_offsets = [0]
+        self.edge_offsets = [0]
+        self.worker_counts = []
+        self.family_ids = []
+        self.families = {}
+        self.hashes = []
+        self.makespans = []
+        self.normalization = []
+        self.num_features = None
+
+    def write(self, data: Data, worker_count: int, family: Optional[str] = None,
+              graph_hash: Optional[str] = None):
+        x = data.x.numpy().astype(np.float32, copy=False)
+        if self.num_features is None:
+            self.num_features = x.shape[1]
+        assert x.shape[1] == self.num_features
+
+        edges = data.edge_index.numpy().T
+        edges = edges[np.lexsort((edges[:, 1], edges[:, 0]))].astype(np.int64, copy=False)
+
+        self.x_file.write(np.ascontiguousarray(x).tobytes())
+        self.edges_file.write(np.ascontiguousarray(edges).tobytes())
+        self.node_offsets.append(self.node_offsets[-1] + x.shape[0])
+        self.edge_offsets.append(self.edge_offsets[-1] + edges.shape[0])
+        self.worker_counts.append(worker_count)
+        self.family_ids.append(-1 if family is None else
+                               self.families.setdefault(family, len(self.families)))
+        if graph_hash is None:
+            graph_hash = hashlib.sha256(np.ascontiguousarray(x).tobytes() +
+                                        np.ascontiguousarray(edges).tobytes()).hexdigest()
+        self.hashes.append(int(graph_hash[:16], 16))
+        self.makespans.append(float(data.y[0]))
+        self.normalization.append(float(data.normalization_factor))
+
+    def close(self):
+        self.x_file.close()
+        self.edges_file.close()
+        for (name, dtype) in GRAPH_ARRAYS.items():
+            np.asarray(getattr(self, name), dtype=dtype).tofile(array_path(self.path, name))
+        with open(os.path.join(self.path, META_FILE), "w") as f:
+            json.dump({
+                "version": STORE_VERSION,
+                "graph_count": len(self.worker_counts),
+                "node_count": self.node_offsets[-1],
+                "edge_count": self.edge_offsets[-1],
+                "num_features": self.num_features or 0,
+                "families": list(self.families)
+            }, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _missing_array(name: str, count: int) -> np.ndarray:
+    if name == "family_ids":
+        return np.full(count, -1, dtype=GRAPH_ARRAYS[name])
+    if name == "hashes":
+        # Without hashes, every graph is treated as unique
+        return np.arange(count, dtype=GRAPH_ARRAYS[name])
+    raise ValueError(f"Array {name} is missing in the graph store")
+
+
+def convert_dataset(dataset_path: str, store_path: str):
+    """
+    Converts a sharded JSON dataset into a binary graph store, one example at a time.
+    """
+    with GraphStoreWriter(store_path) as writer:
+        for (example, makespan) in iter_dataset(dataset_path):
+            writer.write(example_to_data(example, makespan), example.worker_count,
+                         family=example.family, graph_hash=weighted_hash(example.graph))
+
+
+class GraphStore(torch.utils.data.Dataset):
+    """
+    Memory-mapped view of a binary graph store.
+
+    Opening the store only reads its metadata, the arrays are mapped lazily. Returned `Data`
+    objects are views into the mapped arrays, so no graph data is copied and the pages are
+    shared between DataLoader worker processes through the page cache.
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as f:
+            self.meta = json.load(f)
+        # Stores without a version were written before it was introduced
+        self.version = self.meta.get("version", 1)
+        if self.version > STORE_VERSION:
+            raise ValueError(f"Unsupported graph store version {self.version}")
+        self.arrays = None
+
+    def _map(self):
+        if self.arrays is None:
+            meta = self.meta
+            count = meta["graph_count"]
+            # Copy-on-write mapping, so that the arrays are writable for torch.from_numpy
+            # without touching the file.
+            arrays = {
+                "x": self._memmap("x", np.float32, (meta["node_count"], meta["num_features"])),
+                "edges": self._memmap("edges", np.int64, (meta["edge_count"], 2)),
+            }
+            for (name, dtype) in GRAPH_ARRAYS.items():
+                size = count + 1 if name.endswith("_offsets") else count
+                if self.version < ARRAY_VERSIONS.get(name, 1):
+                    arrays[name] = _missing_array(name, count)
+                else:
+                    arrays[name] = self._memmap(name, dtype, (size,))
+            self.arrays = arrays
+        return self.arrays
+
+    def _memmap(self, name: str, dtype, shape):
+        if 0 in shape:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(array_path(self.path, name), dtype=dtype, mode="c", shape=shape)
+
+    def __len__(self):
+        return self.meta["graph_count"]
+
+    def __getitem__(self, index: int) -> Data:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        arrays = self._map()
+        node_start, node_end = arrays["node_offsets"][index:index + 2]
+        edge_start, edge_end = arrays["edge_offsets"][index:index + 2]
+
+        x = torch.from_numpy(arrays["x"][node_start:node_end])
+        edge_index = torch.from_numpy(arrays["edges"][edge_start:edge_end]).t()
+        return Data(x=x, edge_index=edge_index,
+                    y=torch.from_numpy(arrays["makespans"][index:index + 1]),
+                    normalization_factor=torch.from_numpy(
+                        arrays["normalization"][index:index + 1]))
+
+    def node_counts(self) -> np.ndarray:
+        return np.diff(self._map()["node_offsets"])
+
+    def edge_counts(self) -> np.ndarray:
+        return np.diff(self._map()["edge_offsets"])
+
+    def worker_counts(self) -> np.ndarray:
+        return self._map()["worker_counts"]
+
+    def metadata(self) -> pd.DataFrame:
+        """
+        Returns the per-graph metadata (hash, task count, family, worker count) without
+        touching the node and edge arrays.
+        """
+        arrays = self._map()
+        families = np.array(self.meta.get("families", []) + [None], dtype=object)
+        return pd.DataFrame({
+            "hash": arrays["hashes"],
+            "task_count": self.node_counts(),
+            "family": families[arrays["family_ids"]],
+            "worker_count": arrays["worker_counts"]
+        })
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["arrays"] = None
+        return state
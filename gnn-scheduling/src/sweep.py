@@ -0,0 +1,100 @@
+import csv
+import dataclasses
+import itertools
+from typing import Iterator, List, Optional, Sequence
+
+import pandas as pd
+from estee.common import TaskGraph
+
+from .data import TrainExample
+from .generator import NETMODELS, SimulationConfig, simulate_graph
+from .parallel import parallel_map
+from .simcache import SimulationCache
+
+
+@dataclasses.dataclass()
+class SweepGrid:
+    schedulers: Sequence[str] = ("blevel-gt",)
+    worker_counts: Sequence[int] = (1, 2, 4)
+    cpus: Sequence[int] = (1,)
+    netmodels: Sequence[str] = ("instant",)
+    # Bandwidths are combined only with netmodels that simulate transfers
+    bandwidths: Sequence[float] = (100.0,)
+
+    def configurations(self) -> List[SimulationConfig]:
+        configs = []
+        for (scheduler, cpus, netmodel) in itertools.product(self.schedulers, self.cpus,
+                                                             self.netmodels):
+            if netmodel not in NETMODELS:
+                raise ValueError(f"Unknown netmodel {netmodel}, available: {list(NETMODELS)}")
+            bandwidths = [None] if netmodel == "instant" else self.bandwidths
+            for bandwidth in bandwidths:
+                configs.append(SimulationConfig(scheduler=scheduler, cpus=cpus,
+                                                netmodel=netmodel, bandwidth=bandwidth))
+        return configs
+
+
+# Graphs and simulation cache of the current sweep, set once in every worker process
+_graphs: Sequence[TaskGraph] = ()
+_cache: Optional[SimulationCache] = None
+
+
+def _set_graphs(graphs: Sequence[TaskGraph], cache: Optional[SimulationCache]):
+    global _graphs, _cache
+    _graphs = graphs
+    _cache = cache
+
+
+@dataclasses.dataclass(frozen=True)
+class _Job:
+    graph: int
+    worker_count: int
+    config: SimulationConfig
+
+
+def _run_job(job: _Job) -> dict:
+    example = TrainExample(_graphs[job.graph], job.worker_count)
+    makespan = simulate_graph(example, cache=_cache, config=job.config)
+    return dict(graph=job.graph, worker_count=job.worker_count,
+                **dataclasses.asdict(job.config), makespan=makespan)
+
+
+def iter_sweep(graphs: Sequence[TaskGraph], grid: SweepGrid, processes: Optional[int] = None,
+               seed=0, cache: Optional[SimulationCache] = None) -> Iterator[dict]:
+    """
+    Simulates every graph under every configuration of `grid`.
+
+    The graphs and the cache are sent to each worker process only once, jobs then refer to the
+    graphs by index.
+    Yields one row per (graph, configuration) in a deterministic order.
+    """
+    configs = grid.configurations()
+    jobs = (_Job(graph, worker_count, config)
+            for graph in range(len(graphs))
+            for worker_count in grid.worker_counts
+            for config in configs)
+    return parallel_map(_run_job, jobs, processes=processes, seed=seed, chunksize=16,
+                        initializer=_set_graphs, initargs=(list(graphs), cache))
+
+
+def sweep(graphs: Sequence[TaskGraph], grid: SweepGrid, processes: Optional[int] = None,
+          seed=0, cache: Optional[SimulationCache] = None,
+          output: Optional[str] = None) -> pd.DataFrame:
+    """
+    Returns a long-format table with a makespan for each graph and configuration.
+    If `output` is given, rows are also streamed into a CSV file as they are finished.
+    """
+    rows = iter_sweep(graphs, grid, processes=processes, seed=seed, cache=cache)
+    if output is None:
+        return pd.DataFrame(list(rows))
+
+    results = []
+    with open(output, "w", newline="") as f:
+        writer = None
+        for row in rows:
+            if writer is None:
+                writer = csv.DictWriter(f, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow(row)
+            results.append(row)
+    return pd.DataFrame(results)